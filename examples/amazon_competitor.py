@@ -5,22 +5,45 @@ This demonstrates how to use the X-Ray SDK to debug a multi-step
 competitor selection pipeline.
 """
 
-from dotenv import load_dotenv
-
-
 import sys
 import os
 
-load_dotenv()
 
-sys.path.insert(0, '.')
+# Cyclic rating columns, computed once instead of per candidate.
+LAPTOP_RATINGS = [4.0 + k * 0.1 for k in range(10)]
+CASE_RATINGS = [4.2 + k * 0.1 for k in range(8)]
 
-"""Demo: competitor selection pipeline with multiple steps."""
 
-from xray_sdk import XRayClient, XRayRun, XRayStep
+def candidate(i):
+    """Build search candidate i: a mix of phone cases and laptop items (to show the bug)."""
+    if i % 3 == 0:
+        return {
+            "asin": f"B{i:04d}",
+            "title": f"Laptop Sleeve {i} inch Premium Quality",
+            "category": "Laptop Accessories",
+            "price": 20.0 + (i * 0.1),
+            "rating": LAPTOP_RATINGS[i % 10],
+            "reviews": 100 + i,
+            "description": "High quality laptop protection sleeve with padding"
+        }
+    return {
+        "asin": f"B{i:04d}",
+        "title": f"iPhone 15 Case Model {i}",
+        "category": "Phone Cases",
+        "price": 15.0 + (i * 0.05),
+        "rating": CASE_RATINGS[i % 8],
+        "reviews": 200 + i,
+        "description": "Premium phone case with shock absorption"
+    }
 
 
 def main():
+    # Environment and import path are only needed when run as a script.
+    from dotenv import load_dotenv
+    load_dotenv()
+    sys.path.insert(0, '.')
+    from xray_sdk import XRayClient, XRayRun, XRayStep
+
     # Simulate a pipeline execution with a bug in step 1
     
     # Create a new run
@@ -51,44 +74,23 @@ def main():
     ))
     
     # Step 2: Search API - Now with 500 candidates to test summarization!
-    # Generate 500 candidates with detailed data (~100K chars, will be summarized to 100)
-    all_candidates = []
-    for i in range(500):
-        # Mix of phone cases and laptop items (to show the bug)
-        if i % 3 == 0:
-            all_candidates.append({
-                "asin": f"B{i:04d}",
-                "title": f"Laptop Sleeve {i} inch Premium Quality",
-                "category": "Laptop Accessories",
-                "price": 20.0 + (i * 0.1),
-                "rating": 4.0 + (i % 10) * 0.1,
-                "reviews": 100 + i,
-                "description": "High quality laptop protection sleeve with padding"
-            })
-        else:
-            all_candidates.append({
-                "asin": f"B{i:04d}",
-                "title": f"iPhone 15 Case Model {i}",
-                "category": "Phone Cases",
-                "price": 15.0 + (i * 0.05),
-                "rating": 4.2 + (i % 8) * 0.1,
-                "reviews": 200 + i,
-                "description": "Premium phone case with shock absorption"
-            })
-    
-    print(f"\n📊 Step 2 has {len(all_candidates)} candidates (~{len(str(all_candidates))} chars)")
-    
-    run.add_step(XRayStep(
+    # Generate 500 candidates with detailed data (~100K chars, will be summarized to 20)
+    search_step = XRayStep(
         name="search",
         order=2,
         description="API call step - searches Amazon catalog using the generated keywords to retrieve candidate products.",
         inputs={
             "keywords": ["phone case", "iphone 15 case", "laptop cover", "protective case"]
-        },
-        outputs={
-            "candidates": all_candidates  # 500 items - will be auto-summarized to 100!
         }
-    ))
+    )
+    # 500 items streamed from a generator - will be auto-summarized to 20!
+    search_step.add_output_stream("candidates", (candidate(i) for i in range(500)))
+    run.add_step(search_step)
+    
+    # *_total_count is only set when the stream had to be sampled
+    outputs = search_step.outputs
+    total = outputs.get('candidates_total_count', len(outputs['candidates']))
+    print(f"\n📊 Step 2 had {total} candidates")
     
     # Step 3: Filter
     run.add_step(XRayStep(
@@ -1,14 +1,12 @@
 """Scenario: call GET endpoints via SDK helpers."""
 
-from dotenv import load_dotenv
-
 import os
+from dotenv import load_dotenv
 from xray_sdk import XRayClient
 
 
-load_dotenv()
-
 def main() -> None:
+    load_dotenv()
     client = XRayClient("https://ai-agent-x-ray.onrender.com", api_key=os.getenv("XRAY_API_KEY"))
 
     pipelines = client.list_pipelines()
@@ -1,45 +1,62 @@
-from dotenv import load_dotenv
-
-load_dotenv()
-
 """Scenario: large outputs to exercise summarization + config inputs."""
 
 import os
+from dotenv import load_dotenv
 from xray_sdk import XRayClient, XRayRun, XRayStep
 
 
-def main() -> None:
-    run = XRayRun("scenario_large_payload", metadata={"case": "large_payload"}, sample_size=50)
-    
-    # Generate 3000 candidates with detailed data (~800K+ chars total, will be summarized)
-    candidates = [
-        {
+# Per-column lookup tables: repeating values are computed once and shared
+# by every row instead of being re-formatted for each candidate.
+DESCRIPTION = "High-quality protective case with shock absorption, anti-scratch coating, and precise cutouts for all ports and buttons. Compatible with wireless charging. Features military-grade drop protection and a lifetime warranty."
+RATINGS = [4.0 + k / 10 for k in range(10)]
+PRICES = [15.99 + k for k in range(20)]
+SELLERS = [f"Seller_{k}" for k in range(50)]
+BRANDS = [f"Brand_{k}" for k in range(30)]
+COLORS = ["Black", "White", "Blue", "Red", "Green"]
+MATERIALS = ["Silicone", "Leather", "Plastic", "Carbon Fiber"]
+
+
+def candidate_rows(count: int):
+    """Yield candidate dicts lazily so only the rows the SDK keeps are built."""
+    for i in range(1, count + 1):
+        yield {
             "id": f"B{i:04d}",
             "title": f"Premium Phone Case Model {i} - Ultra Slim Design with Maximum Protection",
-            "description": f"High-quality protective case with shock absorption, anti-scratch coating, and precise cutouts for all ports and buttons. Compatible with wireless charging. Features military-grade drop protection and a lifetime warranty.",
-            "rating": 4.0 + (i % 10) / 10,
-            "price": 15.99 + (i % 20),
+            "description": DESCRIPTION,
+            "rating": RATINGS[i % 10],
+            "price": PRICES[i % 20],
             "reviews_count": 100 + i * 5,
-            "seller": f"Seller_{i % 50}",
+            "seller": SELLERS[i % 50],
             "in_stock": i % 3 != 0,
             "category": "Phone Accessories",
-            "brand": f"Brand_{i % 30}",
-            "color": ["Black", "White", "Blue", "Red", "Green"][i % 5],
-            "material": ["Silicone", "Leather", "Plastic", "Carbon Fiber"][i % 4]
+            "brand": BRANDS[i % 30],
+            "color": COLORS[i % 5],
+            "material": MATERIALS[i % 4]
         }
-        for i in range(1, 3001)  # 3000 items
-    ]
+
+
+def main() -> None:
+    load_dotenv()
+    run = XRayRun("scenario_large_payload", metadata={"case": "large_payload"}, sample_size=50)
     
-    print(f"📊 Generated {len(candidates)} candidates (~{len(str(candidates))} chars)")
-    print("   (Payload exceeds 80K limit - check API logs to see summarization in action)")
+    # Generate 3000 candidates with detailed data (~800K+ chars total, will be summarized).
+    # A generator keeps the full list from ever being built; the SDK samples it as it streams.
+    candidates = candidate_rows(3000)
 
-    run.add_step(XRayStep(
+    search_step = XRayStep(
         name="search",
         order=1,
         inputs={"keywords": ["phone case", "iphone 15 case"]},
-        outputs={"candidates": candidates},
         description="Search the catalog and return candidate items."
-    ))
+    )
+    search_step.add_output_stream("candidates", candidates)
+    run.add_step(search_step)
+
+    # *_total_count is only set when the stream had to be sampled
+    outputs = search_step.outputs
+    total = outputs.get('candidates_total_count', len(outputs['candidates']))
+    print(f"📊 Generated {total} candidates")
+    print("   (Payload exceeds 80K limit - check API logs to see summarization in action)")
     run.add_step(XRayStep(
         name="filter",
         order=2,
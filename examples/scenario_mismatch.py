@@ -1,14 +1,12 @@
 """Scenario: intentional mismatch (wrong keywords → wrong candidates)."""
 
-from dotenv import load_dotenv
-
 import os
+from dotenv import load_dotenv
 from xray_sdk import XRayClient, XRayRun, XRayStep
 
 
-load_dotenv()
-
 def main() -> None:
+    load_dotenv()
     run = XRayRun("scenario_mismatch", metadata={"case": "mismatch"}, sample_size=20)
     run.add_step(XRayStep(
         name="keyword_generation",
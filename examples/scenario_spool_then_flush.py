@@ -1,14 +1,12 @@
 """Scenario: force spooling (bad port) then flush to real API."""
 
-from dotenv import load_dotenv
-
 import os
+from dotenv import load_dotenv
 from xray_sdk import XRayClient, XRayRun, XRayStep
 
 
-load_dotenv()
-
 def main() -> None:
+    load_dotenv()
     run = XRayRun("scenario_spool_then_flush", metadata={"case": "spool"}, sample_size=20)
     run.add_step(XRayStep(
         name="stage1",
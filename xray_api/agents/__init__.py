@@ -1,3 +1,23 @@
 """
 Agents package for X-Ray API
 """
+
+from functools import lru_cache
+
+from .analyzer import XRayAnalyzer
+
+
+@lru_cache(maxsize=1)
+def get_analyzer() -> XRayAnalyzer:
+    """
+    Process-wide analyzer shared by all requests and background analyses.
+    
+    analyze_run keeps its per-run state local, so one instance serves every
+    thread and its keep-alive HTTP pool and verdict cache stay warm. A missing
+    CEREBRAS_API_KEY raises here on every call, since failures are not cached.
+    """
+    analyzer = XRayAnalyzer()
+    # Build the transport now rather than racing to create it from several request threads
+    analyzer.client
+    analyzer.session
+    return analyzer
@@ -3,11 +3,194 @@ XRayAnalyzer - AI agent for analyzing pipeline runs using Cerebras API
 Uses sliding-window analysis to stay under token limits.
 """
 
+import hashlib
+import io
 import os
 import json
 import logging
-from typing import Dict, Any, List
-from openai import OpenAI
+import random
+import re
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from functools import cached_property, lru_cache
+from itertools import islice
+from typing import Dict, Any, FrozenSet, Iterable, Iterator, List, Optional, Tuple
+import requests
+try:
+    import orjson
+except ImportError:  # optional speedup; stdlib json is used without it
+    orjson = None
+from .cache import VerdictCache
+
+__all__ = ["XRayAnalyzer"]
+
+
+# System prompt for window analysis (2 steps); built once and reused for every window.
+_SYSTEM_PROMPT = """You are analyzing a WINDOW of 2 consecutive steps from a pipeline.
+
+## Understanding the Pipeline & Steps
+First, use the **pipeline description** to understand what TYPE of pipeline this is:
+- Is it a data processing pipeline? (ETL, data transformation)
+- Is it an AI/ML pipeline? (inference, embeddings, classification)
+- Is it a document pipeline? (parsing, extraction, summarization)
+- Is it an automation pipeline? (scraping, API calls, integrations)
+
+Then, use each **step description** to understand what TYPE of step it is:
+- Data retrieval steps (fetching from DB, API, files)
+- Transformation steps (parsing, filtering, mapping)
+- AI/LLM steps (generation, embedding, classification)
+- Output steps (writing, sending, storing)
+
+## Check Data Flow
+With the pipeline type and step types in mind, check if data flows correctly:
+1. Does Step 2's input match Step 1's output?
+2. Are there semantic mismatches given what each step is supposed to do?
+3. Did anything get lost or corrupted in the transition?
+4. Does the output format match what the next step type expects?
+
+## Use Available Context
+- **Reasons**: If present, shows why items were dropped/rejected - useful for understanding filtering logic
+- **Metrics**: If present, shows step performance (e.g., elimination_rate) - useful for spotting anomalies
+
+## IMPORTANT: Config Inputs vs Data Flow Inputs
+Many step inputs are **configuration parameters** (filters, thresholds, limits, options) that come from settings, NOT from the previous step. Examples:
+- `min_rating`, `max_price`, `limit`, `threshold`, `filter_by`, `sort_order`
+- These are expected and normal - do NOT flag them as "missing data flow"
+
+Also, data often flows **implicitly** between steps (via shared state, databases, or function chaining) without being explicitly declared in inputs. If a step has only config inputs, assume the data flows implicitly and focus on whether the **outputs make sense** given the step's purpose.
+
+**Only flag as faulty if:**
+- Outputs contain wrong/corrupted data that doesn't match the step's purpose
+- There's a clear semantic mismatch (e.g., laptop items in a phone case filter)
+- The outputs contradict the config (e.g., items with rating 4.1 when min_rating was 4.5)
+
+Respond in valid JSON:
+{
+    "faulty_step": "step_name or null if transition looks OK",
+    "faulty_step_order": step_number or null,
+    "reason": "What went wrong between these steps",
+    "transition_status": "ok|warning|error"
+}"""
+
+# Same instructions for a request that packs several windows; only the reply shape differs.
+_BATCH_SYSTEM_PROMPT = (
+    "The message contains SEVERAL numbered windows. Apply the instructions below to each window independently.\n\n"
+    + _SYSTEM_PROMPT[:_SYSTEM_PROMPT.index("Respond in valid JSON:")]
+    + """Respond in valid JSON with one object per window, in window order:
+[
+    {
+        "window": window_number,
+        "faulty_step": "step_name or null if transition looks OK",
+        "faulty_step_order": step_number or null,
+        "reason": "What went wrong between these steps",
+        "transition_status": "ok|warning|error"
+    }
+]"""
+)
+
+# Shared, never-mutated message dicts reused by every request.
+_SYSTEM_MESSAGE = {"role": "system", "content": _SYSTEM_PROMPT}
+_BATCH_SYSTEM_MESSAGE = {"role": "system", "content": _BATCH_SYSTEM_PROMPT}
+
+_ORJSON_OPTIONS = (orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY) if orjson is not None else 0
+_json_loads = orjson.loads if orjson is not None else json.loads
+
+
+def _json_bytes(data: Any) -> bytes:
+    """
+    Compact JSON via orjson, falling back to stdlib json for values it rejects (e.g. >64-bit ints).
+    
+    Used for prompts as well as size probes: the model reads compact JSON fine,
+    and indentation only costs tokens.
+    """
+    if orjson is not None:
+        try:
+            return orjson.dumps(data, default=str, option=_ORJSON_OPTIONS)
+        except TypeError:
+            pass
+    return json.dumps(data, separators=(",", ":"), default=str, ensure_ascii=False).encode()
+
+
+# Window prompt skeleton; the headers are filled per prompt, step blocks are written as bytes after them.
+_PIPELINE_HEADER_TEMPLATE = (
+    "## Pipeline: {pipeline_name}\n"
+    "**Pipeline Description (use this to understand the pipeline type):** {pipeline_description}\n"
+    "\n"
+)
+
+
+@lru_cache(maxsize=64)
+def _pipeline_header_bytes(pipeline_name: str, pipeline_description: str) -> bytes:
+    return _PIPELINE_HEADER_TEMPLATE.format(
+        pipeline_name=pipeline_name,
+        pipeline_description=pipeline_description
+    ).encode()
+
+
+_WINDOW_HEADER_TEMPLATE = "## Window {window}: Steps {first_order} → {last_order}\n\n"
+_WINDOW_FOOTER = (
+    b"Analyze the transition between these steps. "
+    b"Consider the pipeline type and step purposes when evaluating data flow."
+)
+_BATCH_FOOTER = (
+    b"Analyze the transition within each window independently. "
+    b"Consider the pipeline type and step purposes when evaluating data flow."
+)
+_PURPOSE_PREFIX = b"**Step Type/Purpose (use this to understand what this step does):** "
+_PURPOSE_MISSING = b"**Step Type/Purpose:** Not provided - infer from step name and data"
+
+# Leading ```/```json and trailing ``` fences around an LLM JSON reply; orjson skips surrounding whitespace.
+_FENCE_RE = re.compile(r'\A\s*```(?:json)?|```\s*\Z')
+
+
+@lru_cache(maxsize=128)
+def _decode_reply(text: str) -> Any:
+    """Decode a fenced or bare JSON reply. Shared result: callers must not mutate it."""
+    return _json_loads(_FENCE_RE.sub('', text))
+
+
+# Summarized (inputs, outputs) per step of recently analyzed runs, keyed by a digest of the raw
+# payloads and shared by every analyzer in the process (re-analysis of a run skips summarization).
+_summary_cache: "OrderedDict[str, List[Tuple[Any, Any]]]" = OrderedDict()
+_summary_cache_lock = threading.Lock()
+
+# Process-wide cap on LLM requests in flight, shared by concurrent analyses (sized on first use).
+_llm_slots: Optional[threading.BoundedSemaphore] = None
+_llm_slots_lock = threading.Lock()
+
+
+def _llm_semaphore(size: int) -> threading.BoundedSemaphore:
+    global _llm_slots
+    with _llm_slots_lock:
+        if _llm_slots is None:
+            _llm_slots = threading.BoundedSemaphore(size)
+        return _llm_slots
+
+
+class _StepView:
+    """
+    Fields of one summarized step, extracted once per analyze_run.
+    
+    Each step appears in two adjacent windows, so its rendered prompt block
+    is built on first use and memoized here.
+    """
+    __slots__ = (
+        'order', 'name', 'description', 'inputs', 'outputs', 'reasons', 'metrics',
+        'prompt_block',
+    )
+
+    def __init__(self, step: Dict[str, Any]):
+        self.order = step.get('step_order', 0)
+        self.name = step.get('step_name', 'unknown')
+        self.description = step.get('step_description') or step.get('description')
+        self.inputs = step.get('inputs', {})
+        self.outputs = step.get('outputs', {})
+        self.reasons = step.get('reasons', {})
+        self.metrics = step.get('metrics', {})
+        self.prompt_block: Optional[bytes] = None
 
 
 class XRayAnalyzer:
@@ -21,6 +204,12 @@ class XRayAnalyzer:
     SAMPLE_SIZE = 100
     MIN_SAMPLE_SIZE = 10
     STRING_TRUNCATE = 2000
+    REQUEST_TIMEOUT = 180  # seconds per chat completion call
+    MAX_RETRIES = 3  # retries on 429/5xx, with jittered exponential backoff
+    MAX_BACKOFF = 30  # seconds
+    MAX_TOKENS = 1000  # reply tokens per window verdict
+    BATCH_MAX_WINDOWS = 8  # windows packed into one request at most
+    SUMMARY_CACHE_SIZE = 16  # runs whose summarized step payloads are kept in memory
     
     def __init__(self):
         """Initialize the analyzer with Cerebras API configuration"""
@@ -28,15 +217,30 @@ class XRayAnalyzer:
         self.base_url = os.getenv('CEREBRAS_BASE_URL', 'https://api.cerebras.ai/v1')
         self.model = os.getenv('CEREBRAS_MODEL', 'llama-3.3-70b')
         self.log_thinking = os.getenv('XRAY_LOG_THINKING', 'true').lower() in ('1', 'true', 'yes')
+        # "http" posts straight to /chat/completions; "openai" goes through the OpenAI SDK
+        self.backend = os.getenv('XRAY_LLM_BACKEND', 'http').lower()
+        # Windows whose token overlap is above this score skip the LLM call (> 1 disables).
+        # Opt-in: token overlap cannot see a single corrupted value passed through a step.
+        self.skip_similarity = float(os.getenv('XRAY_SKIP_SIMILARITY', '1.01'))
+        # Windows whose next-step input tokens are found in prior outputs less often than this are
+        # flagged without an LLM call (0 disables: config-only inputs legitimately have no overlap)
+        self.min_input_overlap = float(os.getenv('XRAY_MIN_INPUT_OVERLAP', '0'))
+        # Max LLM calls in flight at once (per run and across concurrent analyses in the process)
+        self.max_concurrent = max(1, int(os.getenv('XRAY_MAX_CONCURRENT', '8')))
+        # Max LLM requests per analyzed run; later windows are reported as not analyzed (0 = unlimited)
+        self.max_llm_calls = max(0, int(os.getenv('XRAY_MAX_LLM_CALLS', '0')))
+        # Adjacent windows whose step blocks fit in this many chars share one LLM request (0 disables)
+        self.batch_prompt_chars = int(os.getenv('XRAY_BATCH_PROMPT_CHARS', '55000'))
+        # Persistent verdict cache for unchanged windows (empty string disables)
+        cache_path = os.getenv('XRAY_ANALYSIS_CACHE', os.path.expanduser('~/.cache/xray-analyzer/verdicts.sqlite3'))
+        cache_size = int(os.getenv('XRAY_ANALYSIS_CACHE_SIZE', str(VerdictCache.DEFAULT_MAX_ENTRIES)))
+        self.cache = VerdictCache(cache_path, cache_size) if cache_path else None
+        # Digest of the parts every window key shares, so per-window keys only hash the prompt
+        self._cache_key_prefix = VerdictCache.key(self.model, _SYSTEM_PROMPT)
         
         if not self.api_key:
             raise ValueError("CEREBRAS_API_KEY environment variable not set")
         
-        self.client = OpenAI(
-            api_key=self.api_key,
-            base_url=self.base_url
-        )
-
         self.logger = logging.getLogger(__name__)
         if not self.logger.handlers:
             logging.basicConfig(level=logging.DEBUG if self.log_thinking else logging.INFO)
@@ -50,7 +254,49 @@ class XRayAnalyzer:
             for noisy_logger in ("openai", "httpx", "httpcore", "werkzeug"):
                 logging.getLogger(noisy_logger).setLevel(logging.WARNING)
     
-    def analyze_run(self, run_data: Dict[str, Any]) -> Dict[str, Any]:
+    @cached_property
+    def client(self):
+        """OpenAI SDK client for the openai backend (None otherwise), built on first LLM call"""
+        if self.backend != 'openai':
+            return None
+        # Imported here so the SDK (pydantic, httpx, ...) only loads when this backend is used
+        import httpx
+        from openai import OpenAI
+        # HTTP/2 multiplexes concurrent windows over one kept-alive TLS connection
+        http_client = httpx.Client(
+            http2=True,
+            limits=httpx.Limits(
+                max_keepalive_connections=self.max_concurrent,
+                max_connections=self.max_concurrent,
+                keepalive_expiry=60.0
+            ),
+            timeout=httpx.Timeout(self.REQUEST_TIMEOUT, connect=10.0)
+        )
+        return OpenAI(
+            api_key=self.api_key,
+            base_url=self.base_url,
+            http_client=http_client,
+            max_retries=0  # _chat_completion retries with the shared backoff policy
+        )
+
+    @cached_property
+    def session(self) -> Optional[requests.Session]:
+        """Keep-alive session for the direct HTTP backend (None otherwise), built on first LLM call"""
+        if self.backend == 'openai':
+            return None
+        # One session shared by all window calls (urllib3 pools are thread-safe)
+        session = requests.Session()
+        # Size the pool to the window fan-out so concurrent calls don't discard connections
+        adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=self.max_concurrent)
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        session.headers.update({
+            "Authorization": f"Bearer {self.api_key}",
+            "Content-Type": "application/json"
+        })
+        return session
+
+    def analyze_run(self, run_data: Dict[str, Any], use_cache: bool = True) -> Dict[str, Any]:
         """
         Analyze a pipeline run using sliding-window approach.
         
@@ -60,6 +306,8 @@ class XRayAnalyzer:
         
         Args:
             run_data: Dictionary containing pipeline run with steps
+            use_cache: Reuse cached window verdicts (default: True). With False
+                every window goes to the LLM and the cache is refreshed.
             
         Returns:
             Analysis result with faulty step identification
@@ -68,211 +316,671 @@ class XRayAnalyzer:
         if not steps:
             return {"error": "No steps to analyze"}
 
+        # Order once, before summarization, so every later pass sees the steps in order.
+        # Runs loaded from the DB are already ordered by step_order; only sort when they are not.
+        orders = [step.get('step_order', 0) for step in steps]
+        if any(a > b for a, b in zip(orders, islice(orders, 1, None))):
+            steps = [steps[i] for i in sorted(range(len(steps)), key=orders.__getitem__)]
+            run_data = dict(run_data, steps=steps)
+
         run_data = self._summarize_run_data(run_data)
-        sorted_steps = sorted(run_data.get('steps', []), key=lambda s: s.get('step_order', 0))
+        sorted_steps = [_StepView(s) for s in run_data['steps']]
 
         window_results = []
         # Always use sliding windows (even for <= WINDOW_SIZE) to keep a single analysis mode
         if len(sorted_steps) <= self.WINDOW_SIZE:
-            result = self._analyze_window(sorted_steps, 0, run_data)
+            result = self._analyze_window(sorted_steps, 0, run_data, use_cache)
             window_results.append(result)
         else:
-            for i in range(len(sorted_steps) - 1):
-                window = sorted_steps[i:i + self.WINDOW_SIZE]
-                result = self._analyze_window(window, i, run_data)
-                window_results.append(result)
-                if result.get('faulty_step'):
-                    break
+            window_results = self._analyze_windows(sorted_steps, run_data, use_cache)
 
         return self._combine_window_results(window_results, sorted_steps)
 
+    def _analyze_windows(
+        self,
+        sorted_steps: List[_StepView],
+        run_data: Dict,
+        use_cache: bool = True,
+    ) -> List[Dict[str, Any]]:
+        """
+        Analyze every sliding window, dispatching LLM calls concurrently.
+        
+        Windows are pre-filtered locally first; the rest run on a thread pool.
+        Results are returned in window order up to and including the first
+        faulty window, exactly as a sequential scan with early exit would.
+        """
+        results: Dict[int, Dict[str, Any]] = {}
+        pending: List[int] = []
+
+        # The token checks are opt-in; only tokenize when one of them is on.
+        check_overlap = self.min_input_overlap > 0
+        check_similarity = self.skip_similarity <= 1
+        if check_overlap or check_similarity:
+            # Tokenize each step once; every step is shared by two windows.
+            output_tokens = [self._step_tokens(s.outputs) for s in sorted_steps]
+            input_tokens = [self._step_tokens(s.inputs) for s in sorted_steps]
+        last_window = len(sorted_steps) - 2
+        for i in range(len(sorted_steps) - 1):
+            if not any(s.inputs or s.outputs for s in sorted_steps[i:i + self.WINDOW_SIZE]):
+                # No data recorded on either side: nothing for the LLM to check
+                results[i] = self._empty_window_result()
+                continue
+            if check_overlap:
+                overlap = self._input_overlap(output_tokens[i], input_tokens[i + 1])
+                if overlap < self.min_input_overlap:
+                    if self.log_thinking:
+                        self.logger.info("[analyzer] window_flagged window=%s overlap=%.2f", i + 1, overlap)
+                    results[i] = self._low_overlap_window_result(sorted_steps[i + 1], overlap)
+                    break
+            # The last window is the only one that sees the final step's outputs
+            if check_similarity and i != last_window:
+                similarity = self._window_similarity(output_tokens[i], input_tokens[i + 1])
+                if similarity > self.skip_similarity:
+                    if self.log_thinking:
+                        self.logger.info("[analyzer] window_skipped window=%s similarity=%.2f", i + 1, similarity)
+                    results[i] = self._skipped_window_result(similarity)
+                    continue
+            pending.append(i)
+
+        if pending:
+            # Render the needed step blocks here, once each: on the worker threads two
+            # windows sharing a step could both encode it, contending for the GIL.
+            for i in pending:
+                for step in sorted_steps[i:i + self.WINDOW_SIZE]:
+                    self._step_block(step)
+            groups = self._group_windows(sorted_steps, pending)
+            if self.max_llm_calls and len(groups) > self.max_llm_calls:
+                for group in groups[self.max_llm_calls:]:
+                    for i in group:
+                        results[i] = self._over_budget_window_result()
+                groups = groups[:self.max_llm_calls]
+            self._dispatch_windows(sorted_steps, groups, pending, run_data, results, use_cache)
+
+        window_results = []
+        for i in sorted(results):
+            window_results.append(results[i])
+            if results[i].get('faulty_step'):
+                break
+        return window_results
+
+    def _group_windows(self, sorted_steps: List[_StepView], pending: List[int]) -> List[List[int]]:
+        """Pack consecutive pending windows into groups whose step blocks fit batch_prompt_chars"""
+        if self.batch_prompt_chars <= 0:
+            return [[i] for i in pending]
+
+        groups: List[List[int]] = []
+        group: List[int] = []
+        group_size = 0
+        for i in pending:
+            size = sum(len(self._step_block(s)) for s in sorted_steps[i:i + self.WINDOW_SIZE])
+            if group and (group_size + size > self.batch_prompt_chars or len(group) >= self.BATCH_MAX_WINDOWS):
+                groups.append(group)
+                group, group_size = [], 0
+            group.append(i)
+            group_size += size
+        groups.append(group)
+        return groups
+
+    def _dispatch_windows(
+        self,
+        sorted_steps: List[_StepView],
+        groups: List[List[int]],
+        pending: List[int],
+        run_data: Dict,
+        results: Dict[int, Dict[str, Any]],
+        use_cache: bool = True,
+    ) -> None:
+        """Analyze the window groups concurrently, stopping once the first fault is settled."""
+        if len(groups) == 1:
+            # Nothing to overlap; skip the pool round trip.
+            results.update(self._analyze_window_group(sorted_steps, groups[0], run_data, use_cache))
+            return
+
+        faulty = [i for i, r in results.items() if r.get('faulty_step')]
+        first_fault = min(faulty) if faulty else None
+        # Build the lazy LLM client here instead of letting the workers race to build it
+        _ = self.client if self.backend == 'openai' else self.session
+
+        executor = ThreadPoolExecutor(max_workers=min(self.max_concurrent, len(groups)))
+        try:
+            futures = {
+                executor.submit(self._analyze_window_group, sorted_steps, group, run_data, use_cache): group
+                for group in groups
+            }
+            for future in as_completed(futures):
+                if future.cancelled():
+                    continue
+                group_results = future.result()
+                results.update(group_results)
+                faulty = [i for i, r in group_results.items() if r.get('faulty_step')]
+                if faulty and (first_fault is None or min(faulty) < first_fault):
+                    first_fault = min(faulty)
+                    # Later windows can no longer change the verdict.
+                    for other, group in futures.items():
+                        if group[0] > first_fault:
+                            other.cancel()
+                if first_fault is not None and all(j in results for j in pending if j < first_fault):
+                    break
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def _analyze_window_group(
+        self,
+        sorted_steps: List[_StepView],
+        group: List[int],
+        run_data: Dict,
+        use_cache: bool = True,
+    ) -> Dict[int, Dict[str, Any]]:
+        """
+        Analyze a group of windows with one LLM request.
+        
+        Cached verdicts are reused, and any window the batched reply does not
+        cover falls back to its own _analyze_window call.
+        """
+        if len(group) == 1:
+            i = group[0]
+            return {i: self._analyze_window(sorted_steps[i:i + self.WINDOW_SIZE], i, run_data, use_cache)}
+
+        results: Dict[int, Dict[str, Any]] = {}
+        cache_keys: Dict[int, str] = {}
+        if self.cache is not None:
+            for i in group:
+                prompt = self._build_window_prompt(sorted_steps[i:i + self.WINDOW_SIZE], i, run_data)
+                cache_keys[i] = VerdictCache.key(self._cache_key_prefix, prompt)
+                cached = self.cache.get(cache_keys[i]) if use_cache else None
+                if cached is not None:
+                    results[i] = cached
+
+        remaining = [i for i in group if i not in results]
+        if len(remaining) > 1:
+            prompt = self._build_batch_prompt(sorted_steps, remaining, run_data)
+            if self.log_thinking:
+                self.logger.info("[analyzer] batch_prompt windows=%s size=%s", [i + 1 for i in remaining], len(prompt))
+            try:
+                result_text = self._chat_completion([
+                    _BATCH_SYSTEM_MESSAGE,
+                    {"role": "user", "content": prompt}
+                ], max_tokens=self.MAX_TOKENS * len(remaining))
+                verdicts = self._parse_batch_response(result_text, remaining)
+            except Exception as e:
+                self.logger.warning("[analyzer] batch request failed, analyzing windows separately: %s", e)
+                verdicts = {}
+            for i, verdict in verdicts.items():
+                results[i] = verdict
+                if i in cache_keys:
+                    self.cache.set(cache_keys[i], verdict)
+
+        for i in remaining:
+            if i not in results:
+                results[i] = self._analyze_window(sorted_steps[i:i + self.WINDOW_SIZE], i, run_data, use_cache)
+        return results
+
     def _summarize_run_data(self, run_data: Dict[str, Any]) -> Dict[str, Any]:
         """Apply server-side summarization to keep prompts bounded."""
+        steps = run_data.get("steps", [])
+        key = self._summary_key(steps)
+        sides = None
+        if key is not None:
+            with _summary_cache_lock:
+                sides = _summary_cache.get(key)
+                if sides is not None:
+                    _summary_cache.move_to_end(key)
+        if sides is None:
+            sides = [
+                (self._ensure_within_budget(step.get("inputs")), self._ensure_within_budget(step.get("outputs")))
+                for step in steps
+            ]
+            if key is not None:
+                with _summary_cache_lock:
+                    _summary_cache[key] = sides
+                    while len(_summary_cache) > self.SUMMARY_CACHE_SIZE:
+                        _summary_cache.popitem(last=False)
+
         summarized = dict(run_data)
-        summarized_steps = []
-        for step in run_data.get("steps", []):
-            summarized_step = dict(step)
-            summarized_step["inputs"] = self._ensure_within_budget(step.get("inputs"))
-            summarized_step["outputs"] = self._ensure_within_budget(step.get("outputs"))
-            summarized_steps.append(summarized_step)
-        summarized["steps"] = summarized_steps
+        summarized["steps"] = [
+            dict(step, inputs=inputs, outputs=outputs)
+            for step, (inputs, outputs) in zip(steps, sides)
+        ]
         return summarized
 
+    @staticmethod
+    def _summary_key(steps: List[Dict[str, Any]]) -> Optional[str]:
+        """Digest of the step payloads summarization depends on, or None if they can't be encoded"""
+        try:
+            payload = _json_bytes([[step.get("inputs"), step.get("outputs")] for step in steps])
+        except (TypeError, ValueError):
+            return None
+        return hashlib.blake2b(payload, digest_size=16).hexdigest()
+
     def _ensure_within_budget(self, data: Any) -> Any:
         if data is None:
             return {}
         try:
-            size = len(json.dumps(data, default=str))
+            size = len(_json_bytes(data))
         except Exception:
             size = self.MAX_PAYLOAD_SIZE + 1
         if size <= self.MAX_PAYLOAD_SIZE:
             return data
         # Log that summarization is happening
         self.logger.info(f"[analyzer] Summarizing large payload: {size} chars -> MAX {self.MAX_PAYLOAD_SIZE} chars")
-        summarized = self._summarize_with_budget(data)
-        new_size = len(json.dumps(summarized, default=str))
+        summarized, new_size = self._summarize_with_budget(data)
         self.logger.info(f"[analyzer] Summarization complete: {size} -> {new_size} chars")
         return summarized
 
-    def _summarize_with_budget(self, data: Any) -> Any:
+    def _summarize_with_budget(self, data: Any) -> Tuple[Any, int]:
+        """Summarize until within budget; returns the summary and its measured size"""
         sample_size = self.SAMPLE_SIZE
         summarized = data
         while True:
-            summarized = self._summarize_once(summarized, sample_size)
-            size = len(json.dumps(summarized, default=str))
+            summarized, _ = self._summarize_once(summarized, sample_size)
+            size = len(_json_bytes(summarized))
             if size <= self.MAX_PAYLOAD_SIZE or sample_size <= self.MIN_SAMPLE_SIZE:
-                return summarized
-            sample_size = max(self.MIN_SAMPLE_SIZE, sample_size // 2)
+                return summarized, size
+            # Jump straight to the sample size the overshoot calls for (list content scales
+            # ~linearly with it), shrinking at least by half so string-heavy data still converges.
+            estimate = int(sample_size * self.MAX_PAYLOAD_SIZE / size)
+            sample_size = max(self.MIN_SAMPLE_SIZE, min(sample_size // 2, estimate))
 
-    def _summarize_once(self, data: Any, sample_size: int) -> Any:
-        if isinstance(data, dict):
-            summarized = {}
-            for key, value in data.items():
-                if isinstance(value, list):
-                    summarized_list, total_count = self._summarize_list(value, sample_size)
-                    summarized[key] = summarized_list
+    def _summarize_once(self, data: Any, sample_size: int) -> Tuple[Any, bool]:
+        """
+        Summarize one JSON node, returning (result, modified).
+        
+        Copy-on-write: a container is only rebuilt once one of its children
+        changes, so untouched subtrees are returned as the original objects.
+        Exact type checks are enough for JSON-shaped data.
+        """
+        kind = type(data)
+        if kind is dict:
+            summarized = None
+            for index, (key, value) in enumerate(data.items()):
+                total_count = None
+                if type(value) is list:
+                    new_value, total_count = self._summarize_list(value, sample_size)
+                    modified = new_value is not value
+                else:
+                    new_value, modified = self._summarize_once(value, sample_size)
+                if modified and summarized is None:
+                    summarized = dict(islice(data.items(), index))
+                if summarized is not None:
+                    summarized[key] = new_value
                     if total_count is not None:
                         summarized[f"{key}_total_count"] = total_count
-                else:
-                    summarized[key] = self._summarize_once(value, sample_size)
-            return summarized
-        if isinstance(data, list):
+            if summarized is None:
+                return data, False
+            return summarized, True
+        if kind is list:
             summarized_list, _ = self._summarize_list(data, sample_size)
-            return summarized_list
-        if isinstance(data, str) and len(data) > self.STRING_TRUNCATE:
+            return summarized_list, summarized_list is not data
+        if kind is str and len(data) > self.STRING_TRUNCATE:
             overflow = len(data) - self.STRING_TRUNCATE
-            return f"{data[:self.STRING_TRUNCATE]}...[truncated {overflow} chars]"
-        return data
+            return f"{data[:self.STRING_TRUNCATE]}...[truncated {overflow} chars]", True
+        return data, False
 
-    def _summarize_list(self, items: List[Any], sample_size: int):
+    def _summarize_list(self, items: List[Any], sample_size: int) -> Tuple[List[Any], Optional[int]]:
+        """Head/tail sample of a list; returns items itself when nothing needed summarizing"""
         total_count = None
         if len(items) > sample_size:
             total_count = len(items)
             head_count = sample_size // 2
             tail_count = sample_size - head_count
             items = items[:head_count] + items[-tail_count:]
-        return [self._summarize_once(item, sample_size) for item in items], total_count
+        summarized = None
+        truncate = self.STRING_TRUNCATE
+        for index, item in enumerate(items):
+            kind = type(item)
+            if kind is not dict and kind is not list and (kind is not str or len(item) <= truncate):
+                # Leaf that needs no summarizing (the common case for rows/metrics); skip the call
+                if summarized is not None:
+                    summarized.append(item)
+                continue
+            new_item, modified = self._summarize_once(item, sample_size)
+            if modified and summarized is None:
+                summarized = items[:index]
+            if summarized is not None:
+                summarized.append(new_item)
+        if summarized is None:
+            return items, total_count
+        return summarized, total_count
+
+    def _step_tokens(self, data: Any) -> FrozenSet[str]:
+        """Collect lowercased JSON keys and whitespace-split scalar values of a payload."""
+        tokens = set()
+        stack = [data]
+        while stack:
+            item = stack.pop()
+            if isinstance(item, dict):
+                tokens.update(str(key).lower() for key in item)
+                stack.extend(item.values())
+            elif isinstance(item, list):
+                stack.extend(item)
+            elif item is not None:
+                tokens.update(str(item).lower().split())
+        return frozenset(tokens)
+
+    @staticmethod
+    def _window_similarity(out_tokens: FrozenSet[str], in_tokens: FrozenSet[str]) -> float:
+        """Jaccard score between one step's output tokens and the next step's input tokens."""
+        if not out_tokens or not in_tokens:
+            return 0.0
+        return len(out_tokens & in_tokens) / len(out_tokens | in_tokens)
+
+    @staticmethod
+    def _input_overlap(out_tokens: FrozenSet[str], in_tokens: FrozenSet[str]) -> float:
+        """Fraction of the next step's input tokens that appear in the previous step's outputs."""
+        if not in_tokens:
+            return 1.0
+        return len(in_tokens & out_tokens) / len(in_tokens)
+
+    def _low_overlap_window_result(self, step: _StepView, overlap: float) -> Dict[str, Any]:
+        """Synthetic verdict for a window whose inputs share almost nothing with prior outputs"""
+        return {
+            "faulty_step": step.name,
+            "faulty_step_order": step.order,
+            "reason": f"Step inputs are not derived from the previous step's outputs (token overlap {overlap:.2f})",
+            "transition_status": "error",
+            "skipped": True,
+            "overlap": round(overlap, 3)
+        }
+
+    def _skipped_window_result(self, similarity: float) -> Dict[str, Any]:
+        """Synthetic verdict for a window whose data flow is verified locally"""
+        return {
+            "faulty_step": None,
+            "faulty_step_order": None,
+            "reason": "Next step inputs closely match previous step outputs",
+            "transition_status": "ok",
+            "skipped": True,
+            "similarity": round(similarity, 3)
+        }
+
+    def _empty_window_result(self) -> Dict[str, Any]:
+        """Synthetic verdict for a window whose steps recorded no inputs or outputs"""
+        return {
+            "faulty_step": None,
+            "faulty_step_order": None,
+            "reason": "No inputs or outputs recorded for these steps",
+            "transition_status": "ok",
+            "skipped": True
+        }
+
+    def _over_budget_window_result(self) -> Dict[str, Any]:
+        """Placeholder for a window left unanalyzed by the XRAY_MAX_LLM_CALLS cap"""
+        return {
+            "faulty_step": None,
+            "faulty_step_order": None,
+            "reason": "Not analyzed: per-run LLM call limit reached",
+            "transition_status": "unknown",
+            "skipped": True,
+            "over_budget": True
+        }
+
+    def _sample_lists(self, data: Any, rng: random.Random) -> Any:
+        """Randomly sample any list longer than SAMPLE_SIZE, keeping a *_total_count sibling."""
+        if isinstance(data, dict):
+            sampled = {}
+            for key, value in data.items():
+                if isinstance(value, list) and len(value) > self.SAMPLE_SIZE:
+                    sampled[key] = self._sample_list(value, rng)
+                    sampled[f"{key}_total_count"] = data.get(f"{key}_total_count", len(value))
+                elif key not in sampled:
+                    sampled[key] = self._sample_lists(value, rng)
+            return sampled
+        if isinstance(data, list):
+            if len(data) > self.SAMPLE_SIZE:
+                return self._sample_list(data, rng)
+            return [self._sample_lists(item, rng) for item in data]
+        return data
 
-    def _analyze_window(self, window_steps: List[Dict], window_index: int, run_data: Dict) -> Dict[str, Any]:
-        """Analyze a window of 2 steps"""
+    def _sample_list(self, items: List[Any], rng: random.Random) -> List[Any]:
+        indices = sorted(rng.sample(range(len(items)), self.SAMPLE_SIZE))
+        return [self._sample_lists(items[i], rng) for i in indices]
+
+    def _step_json(self, step: _StepView) -> Tuple[bytes, bytes]:
+        """Sampled inputs/outputs JSON for a step"""
+        # Seed from the step name (not hash(), which is salted per process) so reruns sample identically
+        rng = random.Random(zlib.crc32(str(step.name).encode()))
+        inputs = self._sample_lists(step.inputs or {}, rng)
+        outputs = self._sample_lists(step.outputs or {}, rng)
+        return _json_bytes(inputs), _json_bytes(outputs)
+
+    def _analyze_window(
+        self,
+        window_steps: List[_StepView],
+        window_index: int,
+        run_data: Dict,
+        use_cache: bool = True,
+    ) -> Dict[str, Any]:
+        """Analyze a window of 2 steps; with use_cache False the cached verdict is replaced, not read"""
         prompt = self._build_window_prompt(window_steps, window_index, run_data)
         if self.log_thinking:
             self.logger.info("[analyzer] window_prompt window=%s size=%s", window_index + 1, len(prompt))
+
+        cache_key = None
+        if self.cache is not None:
+            cache_key = VerdictCache.key(self._cache_key_prefix, prompt)
+            cached = self.cache.get(cache_key) if use_cache else None
+            if cached is not None:
+                if self.log_thinking:
+                    self.logger.info("[analyzer] window_cache_hit window=%s", window_index + 1)
+                return cached
         
         try:
-            response = self.client.chat.completions.create(
-                model=self.model,
-                messages=[
-                    {"role": "system", "content": self._get_system_prompt()},
-                    {"role": "user", "content": prompt}
-                ],
-                temperature=0.1,
-                max_tokens=1000
-            )
-            
-            result_text = response.choices[0].message.content
+            result_text = self._chat_completion([
+                _SYSTEM_MESSAGE,
+                {"role": "user", "content": prompt}
+            ])
             if self.log_thinking:
                 self.logger.info("[analyzer] window_raw_response chars=%s", len(result_text or ""))
             parsed = self._parse_analysis_response(result_text)
             if self.log_thinking:
                 self.logger.info("[analyzer] window_parsed=%s", parsed)
+            # Only structured verdicts are worth replaying
+            if cache_key is not None and 'raw_response' not in parsed:
+                self.cache.set(cache_key, parsed)
             return parsed
             
         except Exception as e:
             return {"error": str(e), "faulty_step": None}
     
-    def _get_system_prompt(self) -> str:
-        """System prompt for window analysis (2 steps)"""
-        return """You are analyzing a WINDOW of 2 consecutive steps from a pipeline.
+    def _chat_completion(self, messages: List[Dict[str, str]], max_tokens: int = MAX_TOKENS) -> str:
+        """
+        Run one chat completion under the process-wide in-flight limit.
+        
+        Rate-limit (429) and server (5xx) errors are retried up to MAX_RETRIES
+        times with jittered exponential backoff, honouring Retry-After; the
+        slot is released while waiting.
+        """
+        slots = _llm_semaphore(self.max_concurrent)
+        for attempt in range(self.MAX_RETRIES + 1):
+            try:
+                with slots:
+                    return self._stream_completion(messages, max_tokens)
+            except Exception as e:
+                delay = self._retry_delay(e, attempt)
+                if delay is None or attempt == self.MAX_RETRIES:
+                    raise
+                self.logger.warning("[analyzer] LLM request failed (%s), retrying in %.1fs", e, delay)
+                time.sleep(delay)
 
-## Understanding the Pipeline & Steps
-First, use the **pipeline description** to understand what TYPE of pipeline this is:
-- Is it a data processing pipeline? (ETL, data transformation)
-- Is it an AI/ML pipeline? (inference, embeddings, classification)
-- Is it a document pipeline? (parsing, extraction, summarization)
-- Is it an automation pipeline? (scraping, API calls, integrations)
+    def _retry_delay(self, error: Exception, attempt: int) -> Optional[float]:
+        """Backoff before retrying error, or None if it is not retryable"""
+        response = getattr(error, 'response', None)
+        status = getattr(error, 'status_code', None) or getattr(response, 'status_code', None)
+        if status is None or (status != 429 and status < 500):
+            return None
+        retry_after = getattr(response, 'headers', {}).get('Retry-After')
+        try:
+            return min(float(retry_after), self.MAX_BACKOFF)
+        except (TypeError, ValueError):
+            return min(2 ** attempt + random.random(), self.MAX_BACKOFF)
 
-Then, use each **step description** to understand what TYPE of step it is:
-- Data retrieval steps (fetching from DB, API, files)
-- Transformation steps (parsing, filtering, mapping)
-- AI/LLM steps (generation, embedding, classification)
-- Output steps (writing, sending, storing)
+    def _stream_completion(self, messages: List[Dict[str, str]], max_tokens: int) -> str:
+        """
+        Stream one chat completion and return the reply text.
+        
+        The stream is closed as soon as a complete JSON verdict has arrived,
+        so trailing fences or commentary are never generated.
+        """
+        if self.client is not None:
+            stream = self.client.chat.completions.create(
+                model=self.model,
+                messages=messages,
+                temperature=0.1,
+                max_tokens=max_tokens,
+                stream=True
+            )
+            try:
+                return self._collect_stream(
+                    chunk.choices[0].delta.content for chunk in stream if chunk.choices
+                )
+            finally:
+                stream.close()
 
-## Check Data Flow
-With the pipeline type and step types in mind, check if data flows correctly:
-1. Does Step 2's input match Step 1's output?
-2. Are there semantic mismatches given what each step is supposed to do?
-3. Did anything get lost or corrupted in the transition?
-4. Does the output format match what the next step type expects?
+        response = self.session.post(
+            f"{self.base_url.rstrip('/')}/chat/completions",
+            # Encoded with orjson: the prompt is the bulk of the body and stdlib json escapes it char by char
+            data=_json_bytes({
+                "model": self.model,
+                "messages": messages,
+                "temperature": 0.1,
+                "max_tokens": max_tokens,
+                "stream": True
+            }),
+            timeout=self.REQUEST_TIMEOUT,
+            stream=True
+        )
+        try:
+            response.raise_for_status()
+            return self._collect_stream(self._sse_deltas(response))
+        finally:
+            response.close()
 
-## Use Available Context
-- **Reasons**: If present, shows why items were dropped/rejected - useful for understanding filtering logic
-- **Metrics**: If present, shows step performance (e.g., elimination_rate) - useful for spotting anomalies
+    @staticmethod
+    def _sse_deltas(response) -> Iterator[Optional[str]]:
+        """Content deltas from an OpenAI-compatible server-sent event stream"""
+        for line in response.iter_lines():
+            if not line.startswith(b"data:"):
+                continue
+            data = line[5:].strip()
+            if data == b"[DONE]":
+                break
+            choices = _json_loads(data).get("choices")
+            if choices:
+                yield (choices[0].get("delta") or {}).get("content")
 
-## IMPORTANT: Config Inputs vs Data Flow Inputs
-Many step inputs are **configuration parameters** (filters, thresholds, limits, options) that come from settings, NOT from the previous step. Examples:
-- `min_rating`, `max_price`, `limit`, `threshold`, `filter_by`, `sort_order`
-- These are expected and normal - do NOT flag them as "missing data flow"
+    @staticmethod
+    def _collect_stream(deltas: Iterable[Optional[str]]) -> str:
+        """Concatenate deltas, stopping at the first point the reply holds a complete JSON object or array"""
+        parts: List[str] = []
+        closer = None
+        for delta in deltas:
+            if not delta:
+                continue
+            parts.append(delta)
+            if closer is None:
+                text = "".join(parts)
+                opener = min((i for i in (text.find('{'), text.find('[')) if i != -1), default=-1)
+                if opener != -1:
+                    closer = '}' if text[opener] == '{' else ']'
+            if closer is not None and closer in delta:
+                text = "".join(parts)
+                # Cut at the closer so a partial fence in the same delta is not kept
+                text = text[:text.rfind(closer) + 1]
+                try:
+                    _json_loads(text[opener:])
+                    return text
+                except json.JSONDecodeError:
+                    pass
+        return "".join(parts)
+    
+    def _get_system_prompt(self) -> str:
+        """System prompt for window analysis (2 steps)"""
+        return _SYSTEM_PROMPT
 
-Also, data often flows **implicitly** between steps (via shared state, databases, or function chaining) without being explicitly declared in inputs. If a step has only config inputs, assume the data flows implicitly and focus on whether the **outputs make sense** given the step's purpose.
+    def _build_window_prompt(self, steps: List[_StepView], window_index: int, run_data: Dict) -> str:
+        """Build prompt for a 2-step window"""
+        buf = io.BytesIO()
+        buf.write(self._pipeline_header(run_data))
+        self._write_window_section(buf.write, steps, window_index)
+        buf.write(_WINDOW_FOOTER)
+        return buf.getvalue().decode()
 
-**Only flag as faulty if:**
-- Outputs contain wrong/corrupted data that doesn't match the step's purpose
-- There's a clear semantic mismatch (e.g., laptop items in a phone case filter)
-- The outputs contradict the config (e.g., items with rating 4.1 when min_rating was 4.5)
+    def _build_batch_prompt(self, sorted_steps: List[_StepView], indices: List[int], run_data: Dict) -> str:
+        """Build one prompt covering several windows, sharing the pipeline header"""
+        buf = io.BytesIO()
+        buf.write(self._pipeline_header(run_data))
+        for i in indices:
+            self._write_window_section(buf.write, sorted_steps[i:i + self.WINDOW_SIZE], i)
+        buf.write(_BATCH_FOOTER)
+        return buf.getvalue().decode()
 
-Respond in valid JSON:
-{
-    "faulty_step": "step_name or null if transition looks OK",
-    "faulty_step_order": step_number or null,
-    "reason": "What went wrong between these steps",
-    "transition_status": "ok|warning|error"
-}"""
+    @staticmethod
+    def _pipeline_header(run_data: Dict) -> bytes:
+        """Encoded pipeline header shared by every window prompt of a run"""
+        return _pipeline_header_bytes(
+            run_data.get('pipeline_name', 'unknown'),
+            run_data.get('pipeline_description') or run_data.get('description') or 'No description provided'
+        )
 
-    def _build_window_prompt(self, steps: List[Dict], window_index: int, run_data: Dict) -> str:
-        """Build prompt for a 2-step window"""
-        pipeline_name = run_data.get('pipeline_name', 'unknown')
-        pipeline_description = run_data.get('pipeline_description') or run_data.get('description') or 'No description provided'
-        
-        parts = [
-            f"## Pipeline: {pipeline_name}",
-            f"**Pipeline Description (use this to understand the pipeline type):** {pipeline_description}",
-            "",
-            f"## Window {window_index + 1}: Steps {steps[0].get('step_order')} → {steps[-1].get('step_order')}",
-            ""
-        ]
-        
+    def _write_window_section(self, write, steps: List[_StepView], window_index: int) -> None:
+        """Write a window heading followed by its step blocks"""
+        write(_WINDOW_HEADER_TEMPLATE.format(
+            window=window_index + 1,
+            first_order=steps[0].order,
+            last_order=steps[-1].order
+        ).encode())
         for step in steps:
-            parts.append(f"### Step {step.get('step_order', '?')}: {step.get('step_name', 'unknown')}")
-            step_description = step.get('step_description') or step.get('description')
-            if step_description:
-                parts.append(f"**Step Type/Purpose (use this to understand what this step does):** {step_description}")
-            else:
-                parts.append("**Step Type/Purpose:** Not provided - infer from step name and data")
-            parts.append(f"**Inputs:** {json.dumps(step.get('inputs', {}), indent=2, default=str)}")
-            parts.append(f"**Outputs:** {json.dumps(step.get('outputs', {}), indent=2, default=str)}")
-            
-            # Include reasons if present (explains why items were dropped/rejected)
-            reasons = step.get('reasons', {})
-            if reasons:
-                parts.append(f"**Reasons (items dropped/rejected):** {json.dumps(reasons, indent=2, default=str)}")
-            
-            # Include metrics if present (step-level performance data)
-            metrics = step.get('metrics', {})
-            if metrics:
-                parts.append(f"**Metrics:** {json.dumps(metrics, indent=2, default=str)}")
-            
-            parts.append("")
-        
-        parts.append("Analyze the transition between these steps. Consider the pipeline type and step purposes when evaluating data flow.")
-        return "\n".join(parts)
+            write(self._step_block(step))
+
+    def _step_block(self, step: _StepView) -> bytes:
+        """Step section of the window prompt, rendered once per run"""
+        if step.prompt_block is None:
+            buf = io.BytesIO()
+            self._write_step_block(buf.write, step)
+            step.prompt_block = buf.getvalue()
+        return step.prompt_block
+
+    def _write_step_block(self, write, step: _StepView) -> None:
+        """Write the step section of the window prompt"""
+        inputs_json, outputs_json = self._step_json(step)
+
+        write(b"### Step ")
+        write(str(step.order).encode())
+        write(b": ")
+        write(str(step.name).encode())
+        write(b"\n")
+        if step.description:
+            write(_PURPOSE_PREFIX)
+            write(str(step.description).encode())
+        else:
+            write(_PURPOSE_MISSING)
+        write(b"\n**Inputs:** ")
+        write(inputs_json)
+        write(b"\n**Outputs:** ")
+        write(outputs_json)
+        write(b"\n")
+        # Include reasons if present (explains why items were dropped/rejected)
+        if step.reasons:
+            write(b"**Reasons (items dropped/rejected):** ")
+            write(_json_bytes(step.reasons))
+            write(b"\n")
+        # Include metrics if present (step-level performance data)
+        if step.metrics:
+            write(b"**Metrics:** ")
+            write(_json_bytes(step.metrics))
+            write(b"\n")
+        write(b"\n")
     
     def _combine_window_results(
         self,
         window_results: List[Dict],
-        all_steps: List[Dict],
+        all_steps: List[_StepView],
     ) -> Dict[str, Any]:
         """Combine results from multiple window analyses"""
+        # Windows past the LLM call cap were never evaluated
+        over_budget = sum(1 for r in window_results if r.get('over_budget'))
+        windows_analyzed = len(window_results) - over_budget
+        windows_skipped = sum(1 for r in window_results if r.get('skipped')) - over_budget
         # Find first faulty step
         for result in window_results:
             if result.get('faulty_step'):
@@ -282,40 +990,74 @@ Respond in valid JSON:
                     "reason": result.get('reason', ''),
                     "suggestion": result.get('suggestion', ''),
                     "analysis_method": "sliding_window",
-                    "windows_analyzed": len(window_results)
+                    "windows_analyzed": windows_analyzed,
+                    "windows_skipped": windows_skipped,
+                    "windows_over_budget": over_budget
                 }
         
-        # No issues found
+        # No issues found; window i covers steps i..i+WINDOW_SIZE-1
+        unchecked = set()
+        for i, result in enumerate(window_results):
+            if result.get('over_budget'):
+                unchecked.update(range(i, i + self.WINDOW_SIZE))
+        if unchecked:
+            reason = "No faults found in the analyzed transitions; some windows were not analyzed (per-run LLM call limit reached)"
+        else:
+            reason = "All step transitions appear correct"
         return {
             "faulty_step": None,
             "faulty_step_order": None,
-            "reason": "All step transitions appear correct",
+            "reason": reason,
             "suggestion": None,
             "analysis_method": "sliding_window",
-            "windows_analyzed": len(window_results),
+            "windows_analyzed": windows_analyzed,
+            "windows_skipped": windows_skipped,
+            "windows_over_budget": over_budget,
             "all_steps_analysis": [
-                {"step": s.get('step_name'), "status": "ok", "note": "Transition verified"}
-                for s in all_steps
+                {"step": s.name, "status": "unchecked", "note": "Not analyzed: per-run LLM call limit reached"}
+                if position in unchecked else
+                {"step": s.name, "status": "ok", "note": "Transition verified"}
+                for position, s in enumerate(all_steps)
             ]
         }
     
+    def _parse_batch_response(self, response_text: str, indices: List[int]) -> Dict[int, Dict[str, Any]]:
+        """Map a batched JSON array reply to window indices; unparseable or missing windows are left out"""
+        try:
+            parsed = _decode_reply(response_text)
+        except json.JSONDecodeError:
+            return {}
+        if not isinstance(parsed, list):
+            return {}
+
+        verdicts: Dict[int, Dict[str, Any]] = {}
+        wanted = set(indices)
+        for position, item in enumerate(parsed):
+            if not isinstance(item, dict):
+                continue
+            window = item.get('window')
+            if isinstance(window, int):
+                i = window - 1
+            elif len(parsed) == len(indices):
+                i = indices[position]
+            else:
+                continue
+            if i in wanted:
+                verdicts[i] = {k: v for k, v in item.items() if k != 'window'}
+        return verdicts
+
     def _parse_analysis_response(self, response_text: str) -> Dict[str, Any]:
         """Parse the LLM response into structured analysis result"""
         try:
-            text = response_text.strip()
-            if text.startswith("```json"):
-                text = text[7:]
-            if text.startswith("```"):
-                text = text[3:]
-            if text.endswith("```"):
-                text = text[:-3]
-            
-            return json.loads(text.strip())
+            parsed = _decode_reply(response_text)
+            if isinstance(parsed, dict):
+                return dict(parsed)
         except json.JSONDecodeError:
-            return {
-                "faulty_step": None,
-                "faulty_step_order": None,
-                "reason": response_text,
-                "suggestion": "Unable to parse structured response",
-                "raw_response": response_text
-            }
+            pass
+        return {
+            "faulty_step": None,
+            "faulty_step_order": None,
+            "reason": response_text,
+            "suggestion": "Unable to parse structured response",
+            "raw_response": response_text
+        }
@@ -0,0 +1,134 @@
+"""
+VerdictCache - Persistent LRU cache of window analysis verdicts
+"""
+
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Optional
+
+try:
+    import orjson
+except ImportError:  # optional speedup; stdlib json is used without it
+    orjson = None
+
+
+class VerdictCache:
+    """
+    SQLite-backed LRU cache mapping a window prompt digest to its parsed verdict.
+
+    Re-running an unchanged pipeline produces identical window prompts, so the
+    stored verdict is returned instead of calling the LLM again. A busy
+    database is treated as a cache miss; any other SQLite error disables the
+    cache for the rest of the process rather than failing the analysis.
+    """
+
+    DEFAULT_MAX_ENTRIES = 10000
+    BUSY_TIMEOUT = 5  # seconds to wait on another process's write lock
+
+    def __init__(self, path: str, max_entries: int = DEFAULT_MAX_ENTRIES):
+        """
+        Open (or create) the cache database.
+
+        Args:
+            path: SQLite file path (parent directories are created)
+            max_entries: Least recently used verdicts beyond this are evicted
+        """
+        self.path = path
+        self.max_entries = max(1, max_entries)
+        self.logger = logging.getLogger(__name__)
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        try:
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._conn = sqlite3.connect(
+                path, timeout=self.BUSY_TIMEOUT, check_same_thread=False, isolation_level=None
+            )
+            # WAL lets the gunicorn workers sharing this file read while one writes
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS verdicts ("
+                "key TEXT PRIMARY KEY, value BLOB NOT NULL, accessed_at REAL NOT NULL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS ix_verdicts_accessed ON verdicts (accessed_at)")
+        except (OSError, sqlite3.Error) as e:
+            self._disable(e)
+
+    @staticmethod
+    def key(*parts: str) -> str:
+        """Stable digest of the strings that determine a verdict"""
+        digest = hashlib.blake2b(digest_size=20)
+        for part in parts:
+            digest.update(part.encode())
+            digest.update(b"\0")
+        return digest.hexdigest()
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Return the cached verdict for key, or None"""
+        with self._lock:
+            if self._conn is None:
+                return None
+            try:
+                row = self._conn.execute("SELECT value FROM verdicts WHERE key = ?", (key,)).fetchone()
+                if row is None:
+                    return None
+                self._conn.execute("UPDATE verdicts SET accessed_at = ? WHERE key = ?", (time.time(), key))
+            except sqlite3.Error as e:
+                if not self._is_busy(e):
+                    self._disable(e)
+                return None
+        try:
+            return orjson.loads(row[0]) if orjson is not None else json.loads(row[0])
+        except ValueError as e:
+            with self._lock:
+                self._disable(e)
+            return None
+
+    def set(self, key: str, value: Dict[str, Any]) -> None:
+        """Store a verdict and evict the least recently used entries over max_entries"""
+        try:
+            if orjson is not None:
+                payload = orjson.dumps(value, default=str)
+            else:
+                payload = json.dumps(value, default=str).encode()
+        except (TypeError, ValueError) as e:
+            self.logger.warning("[cache] Skipping unencodable verdict: %s", e)
+            return
+        with self._lock:
+            if self._conn is None:
+                return
+            try:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO verdicts (key, value, accessed_at) VALUES (?, ?, ?)",
+                    (key, payload, time.time())
+                )
+                self._conn.execute(
+                    "DELETE FROM verdicts WHERE key IN ("
+                    "SELECT key FROM verdicts ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+                    (self.max_entries,)
+                )
+            except sqlite3.Error as e:
+                if not self._is_busy(e):
+                    self._disable(e)
+
+    @staticmethod
+    def _is_busy(error: sqlite3.Error) -> bool:
+        """True for lock contention with another process, which is only a cache miss"""
+        message = str(error).lower()
+        return isinstance(error, sqlite3.OperationalError) and ('locked' in message or 'busy' in message)
+
+    def _disable(self, error: Exception) -> None:
+        """Close the connection and stop caching; callers hold _lock"""
+        self.logger.warning("[cache] Disabling verdict cache at %s: %s", self.path, error)
+        if self._conn is not None:
+            try:
+                self._conn.close()
+            except sqlite3.Error:
+                pass
+        self._conn = None
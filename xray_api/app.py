@@ -2,22 +2,64 @@
 X-Ray API - Flask Application Entry Point
 """
 
+import hmac
 import os
-from flask import Flask
+from flask import Flask, request, jsonify
+from flask.json.provider import DefaultJSONProvider
 from flask_cors import CORS
 from dotenv import load_dotenv
+try:
+    import orjson
+except ImportError:  # optional speedup; Flask's stdlib JSON provider is used without it
+    orjson = None
 
 # Load environment variables
 load_dotenv()
 
-from .models import db
-from .routes.ingest import ingest_bp
+from .models import db, create_search_indexes
+from .routes.ingest import ingest_bp, requeue_queued_runs
 from .routes.query import query_bp
 
+# Paths served without an API key
+PUBLIC_PATHS = frozenset({'/health'})
+
+
+class OrjsonProvider(DefaultJSONProvider):
+    """
+    JSON provider that encodes and decodes with orjson.
+    
+    Values orjson rejects (e.g. ints over 64 bits) and debug-mode pretty
+    printing fall back to the default stdlib provider.
+    """
+    option = orjson.OPT_NON_STR_KEYS if orjson is not None else 0
+
+    def dumps(self, obj, **kwargs):
+        if not kwargs:
+            try:
+                return orjson.dumps(obj, default=self.default, option=self.option).decode()
+            except TypeError:
+                pass
+        return super().dumps(obj, **kwargs)
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        if self._app.debug:
+            return super().response(*args, **kwargs)
+        obj = self._prepare_response_obj(args, kwargs)
+        try:
+            body = orjson.dumps(obj, default=self.default, option=self.option | orjson.OPT_APPEND_NEWLINE)
+        except TypeError:
+            return super().response(*args, **kwargs)
+        return self._app.response_class(body, mimetype=self.mimetype)
+
 
 def create_app():
     """Create and configure the Flask application"""
     app = Flask(__name__)
+    if orjson is not None:
+        app.json = OrjsonProvider(app)
     
     # Configuration
     app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv(
@@ -25,6 +67,15 @@ def create_app():
         'sqlite:///xray.db'  # Fallback to SQLite for local dev
     )
     app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    if not app.config['SQLALCHEMY_DATABASE_URI'].startswith('sqlite'):
+        # Every gunicorn worker process gets its own pool: keep
+        # workers * (pool_size + max_overflow) under the server's max_connections.
+        app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {
+            'pool_size': int(os.getenv('XRAY_DB_POOL_SIZE', '20')),
+            'max_overflow': int(os.getenv('XRAY_DB_MAX_OVERFLOW', '40')),
+            'pool_pre_ping': True,
+            'pool_recycle': 1800,
+        }
     app.config['JSON_SORT_KEYS'] = False
     app.config['XRAY_API_KEY'] = os.getenv('XRAY_API_KEY')
     
@@ -33,21 +84,22 @@ def create_app():
     db.init_app(app)
     
     # API Key authentication middleware
+    expected_key = app.config['XRAY_API_KEY']
+    expected_key_bytes = expected_key.encode() if expected_key else None
+
     @app.before_request
     def check_api_key():
-        from flask import request, jsonify
-        
-        # Skip auth for health endpoint
-        if request.path == '/health':
+        # Skip auth for public endpoints
+        if request.path in PUBLIC_PATHS:
             return None
         
         # Skip if no API key is configured (local dev mode)
-        if not app.config['XRAY_API_KEY']:
+        if expected_key_bytes is None:
             return None
         
-        # Check API key header
+        # Check API key header (constant-time comparison)
         provided_key = request.headers.get('X-API-Key')
-        if not provided_key or provided_key != app.config['XRAY_API_KEY']:
+        if not provided_key or not hmac.compare_digest(provided_key.encode(), expected_key_bytes):
             return jsonify({"error": "Invalid or missing API key"}), 401
         
         return None
@@ -64,11 +116,16 @@ def create_app():
     # Create tables
     with app.app_context():
         db.create_all()
+        create_search_indexes()
+    
+    # Pick up runs whose queued analysis was lost to a restart or redeploy
+    requeue_queued_runs(app)
     
     return app
 
 
-# For running directly: python -m xray_api.app
+# For running directly: python -m xray_api.app (local development only; use xray_api.wsgi in production)
 if __name__ == '__main__':
     app = create_app()
-    app.run(debug=True, host='0.0.0.0', port=5000)
+    debug = os.getenv('FLASK_DEBUG', 'false').lower() in ('1', 'true', 'yes')
+    app.run(debug=debug, host='0.0.0.0', port=5000, threaded=True)
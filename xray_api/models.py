@@ -2,23 +2,63 @@
 SQLAlchemy models for X-Ray API
 """
 
+import logging
+import os
+import time
 import uuid
 from datetime import datetime
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import text
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.exc import SQLAlchemyError
 
 db = SQLAlchemy()
+logger = logging.getLogger(__name__)
+
+
+class GUID(db.TypeDecorator):
+    """UUID stored natively on PostgreSQL (16 bytes) and as String(36) elsewhere; str in Python"""
+    impl = db.String(36)
+    cache_ok = True
+    
+    def load_dialect_impl(self, dialect):
+        if dialect.name == 'postgresql':
+            return dialect.type_descriptor(postgresql.UUID(as_uuid=False))
+        return dialect.type_descriptor(db.String(36))
+
+
+def new_id():
+    """
+    Time-ordered UUID (version 7 layout: millisecond timestamp, then random bits).
+    
+    Consecutive rows get increasing keys, so inserts append to the primary key
+    index instead of splitting pages at random positions.
+    """
+    value = (time.time_ns() // 1_000_000) << 80 | int.from_bytes(os.urandom(10), 'big')
+    value = (value & ~(0xF << 76)) | (0x7 << 76)  # version
+    value = (value & ~(0x3 << 62)) | (0x2 << 62)  # RFC 4122 variant
+    return str(uuid.UUID(int=value))
+
+
+def is_valid_id(value):
+    """True if value parses as a UUID (so it can be compared to a GUID column)"""
+    try:
+        uuid.UUID(value)
+    except (TypeError, ValueError):
+        return False
+    return True
 
 
 class Pipeline(db.Model):
     """A type of workflow (e.g., 'competitor_selection')"""
     __tablename__ = 'pipelines'
     
-    id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
+    id = db.Column(GUID(), primary_key=True, default=new_id)
     name = db.Column(db.String(255), unique=True, nullable=False)
     description = db.Column(db.Text, nullable=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
-    runs = db.relationship('Run', backref='pipeline', lazy='dynamic')
+    runs = db.relationship('Run', back_populates='pipeline', lazy='dynamic')
     
     def to_dict(self):
         return {
@@ -32,15 +72,24 @@ class Pipeline(db.Model):
 class Run(db.Model):
     """Single execution of a pipeline"""
     __tablename__ = 'runs'
+    __table_args__ = (
+        # list_runs: pipeline/status filters with ORDER BY created_at DESC LIMIT n
+        db.Index('ix_runs_pipeline_status_created', 'pipeline_id', 'status', 'created_at'),
+        db.Index('ix_runs_created', 'created_at'),
+    )
     
-    id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
-    pipeline_id = db.Column(db.String(36), db.ForeignKey('pipelines.id'), nullable=False)
+    id = db.Column(GUID(), primary_key=True, default=new_id)
+    pipeline_id = db.Column(GUID(), db.ForeignKey('pipelines.id'), nullable=False)
     status = db.Column(db.String(50), default='pending')
-    run_metadata = db.Column(db.JSON, nullable=True)
-    analysis_result = db.Column(db.JSON, nullable=True)
+    # JSONB on Postgres: stored pre-parsed (and TOAST-compressed when large) instead of as text
+    run_metadata = db.Column(db.JSON().with_variant(postgresql.JSONB(), 'postgresql'), nullable=True)
+    analysis_result = db.Column(db.JSON().with_variant(postgresql.JSONB(), 'postgresql'), nullable=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
-    steps = db.relationship('Step', backref='run', lazy='dynamic', order_by='Step.step_order')
+    # Joined: to_dict() always needs pipeline.name, so load it with the run instead of one SELECT per run
+    pipeline = db.relationship('Pipeline', back_populates='runs', lazy='joined')
+    # A plain ordered collection (not 'dynamic') so routes can selectinload it
+    steps = db.relationship('Step', backref='run', order_by='Step.step_order')
     
     def to_dict(self, include_steps=False):
         result = {
@@ -53,16 +102,53 @@ class Run(db.Model):
             "created_at": self.created_at.isoformat() if self.created_at else None
         }
         if include_steps:
-            result["steps"] = [step.to_dict() for step in self.steps.order_by(Step.step_order)]
+            result["steps"] = [step.to_dict() for step in self.steps]
+        return result
+    
+    def to_dict_fast(self, session):
+        """
+        to_dict(include_steps=True) with the steps read as plain column tuples.
+        
+        Feeds the analyzer without building a Step instance (and going through
+        its instrumented attributes) for every row.
+        """
+        result = self.to_dict()
+        rows = session.query(
+            Step.id, Step.run_id, Step.step_name, Step.step_order, Step.step_description,
+            Step.inputs, Step.outputs, Step.reasons, Step.metrics, Step.created_at
+        ).filter(Step.run_id == self.id).order_by(Step.step_order).all()
+        result["steps"] = [
+            {
+                "id": step_id,
+                "run_id": run_id,
+                "step_name": step_name,
+                "step_order": step_order,
+                "step_description": step_description,
+                "inputs": inputs,
+                "outputs": outputs,
+                "reasons": reasons,
+                "metrics": metrics,
+                "created_at": created_at.isoformat() if created_at else None
+            }
+            for (step_id, run_id, step_name, step_order, step_description,
+                 inputs, outputs, reasons, metrics, created_at) in rows
+        ]
         return result
 
 
 class Step(db.Model):
     """Individual step within a run"""
     __tablename__ = 'steps'
+    __table_args__ = (
+        # A run's steps in order (Run.steps, to_dict_fast) and search_steps' newest-first listing
+        db.Index('ix_steps_run_order', 'run_id', 'step_order'),
+        db.Index('ix_steps_created', 'created_at'),
+        # search_steps' ILIKE '%term%' is backed on Postgres by ix_steps_name_trgm, made by
+        # create_search_indexes() once pg_trgm is installed; SQLite scans
+    )
     
-    id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
-    run_id = db.Column(db.String(36), db.ForeignKey('runs.id'), nullable=False)
+    id = db.Column(GUID(), primary_key=True, default=new_id)
+    run_id = db.Column(GUID(), db.ForeignKey('runs.id'), nullable=False)
     step_name = db.Column(db.String(255), nullable=False)
     step_order = db.Column(db.Integer, nullable=False)
     step_description = db.Column(db.Text, nullable=True)
@@ -85,3 +171,30 @@ class Step(db.Model):
             "metrics": self.metrics,
             "created_at": self.created_at.isoformat() if self.created_at else None
         }
+
+
+def create_search_indexes():
+    """
+    Create the trigram index behind step name search on PostgreSQL.
+    
+    Creating the pg_trgm extension needs a privilege managed roles often
+    lack, so it is left to an operator; the index is only built once the
+    extension is installed, and a missing extension is logged, not raised.
+    """
+    if db.engine.dialect.name != 'postgresql':
+        return
+    try:
+        with db.engine.begin() as conn:
+            installed = conn.execute(text("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")).scalar()
+            if not installed:
+                logger.warning(
+                    "pg_trgm is not installed; step name search will scan the steps table "
+                    "(run CREATE EXTENSION pg_trgm as a privileged role and restart)"
+                )
+                return
+            conn.execute(text(
+                "CREATE INDEX IF NOT EXISTS ix_steps_name_trgm ON steps USING gin (step_name gin_trgm_ops)"
+            ))
+    except SQLAlchemyError as e:
+        # e.g. another worker creating the same index concurrently
+        logger.warning("Could not create the step name trigram index: %s", e)
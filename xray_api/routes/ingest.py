@@ -2,18 +2,223 @@
 Ingest routes - Receive pipeline run data
 """
 
-from flask import Blueprint, request, jsonify
-from ..models import db, Pipeline, Run, Step
-from ..agents.analyzer import XRayAnalyzer
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from flask import Blueprint, current_app, request, jsonify
+from ..models import db, new_id, Pipeline, Run, Step
+from ..agents import get_analyzer
 
 ingest_bp = Blueprint('ingest', __name__)
+logger = logging.getLogger(__name__)
+
+# Runs ingested with ?async=true are analyzed here after the response is sent
+_analysis_executor = ThreadPoolExecutor(
+    max_workers=max(1, int(os.getenv('XRAY_ANALYSIS_WORKERS', '4'))),
+    thread_name_prefix='xray-analysis'
+)
+# Sync batches fan their analyses out here, so a waiting request never
+# queues behind the async backlog
+_batch_analysis_executor = ThreadPoolExecutor(
+    max_workers=max(1, int(os.getenv('XRAY_BATCH_ANALYSIS_WORKERS', '4'))),
+    thread_name_prefix='xray-batch-analysis'
+)
+
+
+def _validate_run_payload(data):
+    """Return an error message if the run payload is invalid, else None"""
+    if data is None:
+        return "No JSON data provided"
+    if not isinstance(data, dict):
+        return "must be an object"
+    if not data:
+        return "No JSON data provided"
+    if not data.get('pipeline_name'):
+        return "pipeline_name is required"
+    if not data.get('steps', []):
+        return "At least one step is required"
+    return None
+
+
+def _store_run(data):
+    """Create (or update) the pipeline and add the run with its steps to the session"""
+    pipeline_name = data.get('pipeline_name')
+    pipeline_description = data.get('pipeline_description') or data.get('description')
+    pipeline = Pipeline.query.filter_by(name=pipeline_name).first()
+    if not pipeline:
+        pipeline = Pipeline(name=pipeline_name, description=pipeline_description)
+        db.session.add(pipeline)
+        db.session.flush()
+    elif pipeline_description:
+        # Update description if provided
+        pipeline.description = pipeline_description
+
+    # Create run
+    run = Run(
+        pipeline_id=pipeline.id,
+        pipeline=pipeline,
+        status='received',
+        run_metadata=data.get('metadata', {})
+    )
+    db.session.add(run)
+    db.session.flush()
+
+    # Create steps as one executemany INSERT rather than one Step instance per row
+    db.session.bulk_insert_mappings(Step, _step_mappings(run.id, data))
+
+    return run
+
+
+def _step_mappings(run_id, data):
+    """Step column mappings for a run payload"""
+    return [
+        {
+            "run_id": run_id,
+            "step_name": step_data.get('name', 'unknown'),
+            "step_order": step_data.get('order', 0),
+            "step_description": step_data.get('description'),
+            "inputs": step_data.get('inputs', {}),
+            "outputs": step_data.get('outputs', {}),
+            "reasons": step_data.get('reasons', {}),
+            "metrics": step_data.get('metrics', {})
+        }
+        for step_data in data.get('steps', [])
+    ]
+
+
+def _store_runs(runs_data, analyze_status='received'):
+    """
+    Add several runs to the session with a fixed number of statements.
+    
+    Pipelines are resolved with one IN query and the missing ones, then all
+    runs, then all steps are bulk-inserted. Runs to analyze start as
+    analyze_status and the rest are written as 'stored' directly. Returns the
+    new run ids in payload order.
+    """
+    descriptions = {}
+    for run_data in runs_data:
+        name = run_data.get('pipeline_name')
+        description = run_data.get('pipeline_description') or run_data.get('description')
+        if description or name not in descriptions:
+            descriptions[name] = description
+
+    pipelines = {
+        pipeline.name: pipeline
+        for pipeline in Pipeline.query.filter(Pipeline.name.in_(list(descriptions)))
+    }
+    pipeline_ids = {name: pipeline.id for name, pipeline in pipelines.items()}
+    missing = []
+    for name, description in descriptions.items():
+        pipeline = pipelines.get(name)
+        if pipeline is None:
+            pipeline_ids[name] = new_id()
+            missing.append({"id": pipeline_ids[name], "name": name, "description": description})
+        elif description:
+            # Update description if provided
+            pipeline.description = description
+    db.session.bulk_insert_mappings(Pipeline, missing)
+
+    run_ids = [new_id() for _ in runs_data]
+    db.session.bulk_insert_mappings(Run, [
+        {
+            "id": run_id,
+            "pipeline_id": pipeline_ids[run_data.get('pipeline_name')],
+            "status": analyze_status if run_data.get('analyze', True) else 'stored',
+            "run_metadata": run_data.get('metadata', {})
+        }
+        for run_id, run_data in zip(run_ids, runs_data)
+    ])
+    db.session.bulk_insert_mappings(Step, [
+        mapping
+        for run_id, run_data in zip(run_ids, runs_data)
+        for mapping in _step_mappings(run_id, run_data)
+    ])
+
+    return run_ids
+
+
+def _analyze_and_save(run, should_analyze):
+    """Run analysis if requested and persist the result, returning it"""
+    analysis_result = None
+
+    if should_analyze:
+        try:
+            analyzer = get_analyzer()
+            run_dict = run.to_dict_fast(db.session)
+            analysis_result = analyzer.analyze_run(run_dict)
+
+            # Save analysis result
+            run.analysis_result = analysis_result
+            run.status = 'analyzed'
+            db.session.commit()
+        except Exception as e:
+            run.status = 'analysis_failed'
+            run.analysis_result = {"error": str(e)}
+            db.session.commit()
+    else:
+        run.status = 'stored'
+        db.session.commit()
+
+    return analysis_result
+
+
+def _run_analysis_and_persist(app, run_id, from_status='queued'):
+    """
+    Analyze a stored run in its own app context (and so its own session).
+    
+    The run is first claimed by moving it from from_status to 'analyzing',
+    so a run re-queued by several workers at startup is analyzed once.
+    Returns (status, analysis_result), or None if the run was not claimed.
+    """
+    with app.app_context():
+        try:
+            claimed = Run.query.filter_by(id=run_id, status=from_status).update(
+                {"status": 'analyzing'}, synchronize_session=False
+            )
+            db.session.commit()
+            if not claimed:
+                return None
+            run = db.session.get(Run, run_id)
+            analysis_result = _analyze_and_save(run, True)
+            return run.status, analysis_result
+        except Exception:
+            logger.exception("Background analysis failed for run %s", run_id)
+            db.session.rollback()
+            return None
+
+
+def _queue_analysis(run_ids, app=None):
+    """Schedule background analysis for runs already committed as 'queued'"""
+    app = app or current_app._get_current_object()
+    for run_id in run_ids:
+        _analysis_executor.submit(_run_analysis_and_persist, app, run_id)
+
+
+def requeue_queued_runs(app):
+    """
+    Queue analysis for runs left 'queued' by a previous process.
+    
+    Queued work only lives in process memory, so runs accepted just before
+    a restart or redeploy are picked up again here. Runs interrupted while
+    'analyzing' are re-run with POST /api/analyze/<run_id>.
+    """
+    with app.app_context():
+        run_ids = [row.id for row in db.session.query(Run.id).filter(Run.status == 'queued')]
+    if run_ids:
+        logger.info("Re-queueing analysis for %d queued runs", len(run_ids))
+        _queue_analysis(run_ids, app)
+
+
+def _wants_async():
+    """True when the caller asked not to wait for analysis with ?async=true"""
+    return request.args.get('async', '').lower() in ('1', 'true', 'yes')
 
 
 @ingest_bp.route('/api/ingest', methods=['POST'])
 def ingest_run():
     """
     Receive a pipeline run and optionally trigger analysis.
-    
+
     Request body:
     {
         "pipeline_name": "competitor_selection",
@@ -24,86 +229,129 @@ def ingest_run():
         ],
         "analyze": true  // optional, default true
     }
+
+    The analysis is returned in a 201 response. Pass ?async=true to run it
+    in the background instead: the response is 202 with status "queued" and
+    the result is read later from /api/runs/<id>/analysis.
     """
-    data = request.get_json()
-    
-    if not data:
-        return jsonify({"error": "No JSON data provided"}), 400
-    
-    pipeline_name = data.get('pipeline_name')
-    if not pipeline_name:
-        return jsonify({"error": "pipeline_name is required"}), 400
-    
-    steps_data = data.get('steps', [])
-    if not steps_data:
-        return jsonify({"error": "At least one step is required"}), 400
-    
+    # Parsed by the app's JSON provider (orjson when installed); cache=False
+    # lets the raw body go as soon as it is decoded
+    data = request.get_json(cache=False)
+
+    error = _validate_run_payload(data)
+    if error:
+        return jsonify({"error": error}), 400
+
     try:
-        # Get or create pipeline
-        pipeline_description = data.get('pipeline_description') or data.get('description')
-        pipeline = Pipeline.query.filter_by(name=pipeline_name).first()
-        if not pipeline:
-            pipeline = Pipeline(name=pipeline_name, description=pipeline_description)
-            db.session.add(pipeline)
-            db.session.flush()
-        elif pipeline_description:
-            # Update description if provided
-            pipeline.description = pipeline_description
-        
-        # Create run
-        run = Run(
-            pipeline_id=pipeline.id,
-            status='received',
-            run_metadata=data.get('metadata', {})
-        )
-        db.session.add(run)
-        db.session.flush()
-        
-        # Create steps
-        for step_data in steps_data:
-            step = Step(
-                run_id=run.id,
-                step_name=step_data.get('name', 'unknown'),
-                step_order=step_data.get('order', 0),
-                step_description=step_data.get('description'),
-                inputs=step_data.get('inputs', {}),
-                outputs=step_data.get('outputs', {}),
-                reasons=step_data.get('reasons', {}),
-                metrics=step_data.get('metrics', {})
-            )
-            db.session.add(step)
-        
-        db.session.commit()
-        
-        # Trigger analysis if requested (default: True)
+        run = _store_run(data)
         should_analyze = data.get('analyze', True)
-        analysis_result = None
-        
-        if should_analyze:
-            try:
-                analyzer = XRayAnalyzer()
-                run_dict = run.to_dict(include_steps=True)
-                analysis_result = analyzer.analyze_run(run_dict)
-                
-                # Save analysis result
-                run.analysis_result = analysis_result
-                run.status = 'analyzed'
-                db.session.commit()
-            except Exception as e:
-                run.status = 'analysis_failed'
-                run.analysis_result = {"error": str(e)}
-                db.session.commit()
-        else:
-            run.status = 'stored'
+        if should_analyze and _wants_async():
+            run.status = 'queued'
             db.session.commit()
-        
+            _queue_analysis([run.id])
+            return jsonify({
+                "success": True,
+                "run_id": run.id,
+                "status": 'queued',
+                "analysis": None
+            }), 202
+
+        db.session.commit()
+
+        # Trigger analysis if requested (default: True)
+        analysis_result = _analyze_and_save(run, should_analyze)
+
         return jsonify({
             "success": True,
             "run_id": run.id,
             "status": run.status,
             "analysis": analysis_result
         }), 201
-        
+
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({"error": str(e)}), 500
+
+
+@ingest_bp.route('/api/ingest/batch', methods=['POST'])
+def ingest_batch():
+    """
+    Receive several pipeline runs in one request.
+
+    Request body:
+    {
+        "runs": [
+            {"pipeline_name": "...", "steps": [...], "analyze": true},
+            ...
+        ]
+    }
+
+    Each run accepts the same fields as /api/ingest, and ?async=true works
+    the same way. Without it the runs are analyzed concurrently on a pool
+    kept apart from the async backlog. Results are returned in the same
+    order as the submitted runs.
+    """
+    data = request.get_json(cache=False)
+
+    runs_data = data.get('runs') if isinstance(data, dict) else None
+    if not runs_data or not isinstance(runs_data, list):
+        return jsonify({"error": "runs must be a non-empty list"}), 400
+
+    for index, run_data in enumerate(runs_data):
+        error = _validate_run_payload(run_data)
+        if error:
+            return jsonify({"error": f"runs[{index}]: {error}"}), 400
+
+    try:
+        # One transaction for every pipeline, run and step in the request
+        sync = not _wants_async()
+        run_ids = _store_runs(runs_data, 'received' if sync else 'queued')
+        db.session.commit()
+
+        analyze_ids = [
+            run_id for run_id, run_data in zip(run_ids, runs_data)
+            if run_data.get('analyze', True)
+        ]
+        if not sync:
+            _queue_analysis(analyze_ids)
+            return jsonify({
+                "success": True,
+                "results": [
+                    {
+                        "run_id": run_id,
+                        "status": 'queued' if run_data.get('analyze', True) else 'stored',
+                        "analysis": None
+                    }
+                    for run_id, run_data in zip(run_ids, runs_data)
+                ]
+            }), 202 if analyze_ids else 201
+
+        # Analyze the runs concurrently, each in its own session, and wait for all of them
+        app = current_app._get_current_object()
+        futures = {
+            run_id: _batch_analysis_executor.submit(_run_analysis_and_persist, app, run_id, 'received')
+            for run_id in analyze_ids
+        }
+
+        results = []
+        for run_id in run_ids:
+            future = futures.get(run_id)
+            if future is None:
+                results.append({"run_id": run_id, "status": 'stored', "analysis": None})
+                continue
+            outcome = future.result()
+            status, analysis_result = outcome if outcome is not None else ('analysis_failed', None)
+            results.append({
+                "run_id": run_id,
+                "status": status,
+                "analysis": analysis_result
+            })
+
+        return jsonify({
+            "success": True,
+            "results": results
+        }), 201
+
     except Exception as e:
         db.session.rollback()
         return jsonify({"error": str(e)}), 500
@@ -2,19 +2,103 @@
 Query routes - Retrieve and analyze pipeline runs
 """
 
-from flask import Blueprint, request, jsonify
-from ..models import db, Pipeline, Run, Step
-from ..agents.analyzer import XRayAnalyzer
+from flask import Blueprint, current_app, request, jsonify, stream_with_context
+from sqlalchemy.orm import selectinload
+from ..models import db, is_valid_id, Pipeline, Run, Step
+from ..agents import get_analyzer
 
 query_bp = Blueprint('query', __name__)
 
+# List endpoints select plain columns and build the same dicts as the models' to_dict(),
+# skipping ORM instance construction for every row.
+_PIPELINE_COLUMNS = (Pipeline.id, Pipeline.name, Pipeline.description, Pipeline.created_at)
+# analysis_result last, so list_runs can leave it off unless ?include=analysis
+_RUN_COLUMNS = (
+    Run.id, Run.pipeline_id, Pipeline.name, Run.status,
+    Run.run_metadata, Run.created_at, Run.analysis_result,
+)
+_STEP_COLUMNS = (
+    Step.id, Step.run_id, Step.step_name, Step.step_order, Step.step_description,
+    Step.inputs, Step.outputs, Step.reasons, Step.metrics, Step.created_at,
+)
+
+# Rows fetched from the cursor (and encoded) per chunk of a streamed list response
+_STREAM_BATCH_ROWS = 500
+
+
+def _isoformat(value):
+    return value.isoformat() if value else None
+
+
+def _pipeline_row(row):
+    """Pipeline.to_dict() for a _PIPELINE_COLUMNS row"""
+    return {
+        "id": row[0],
+        "name": row[1],
+        "description": row[2],
+        "created_at": _isoformat(row[3])
+    }
+
+
+def _run_row(row):
+    """Run.to_dict() for a _RUN_COLUMNS row (without analysis_result if the row stops short of it)"""
+    result = {
+        "id": row[0],
+        "pipeline_id": row[1],
+        "pipeline_name": row[2],
+        "status": row[3],
+        "metadata": row[4]
+    }
+    if len(row) > 6:
+        result["analysis_result"] = row[6]
+    result["created_at"] = _isoformat(row[5])
+    return result
+
+
+def _step_row(row):
+    """Step.to_dict() for a _STEP_COLUMNS row"""
+    return {
+        "id": row[0],
+        "run_id": row[1],
+        "step_name": row[2],
+        "step_order": row[3],
+        "step_description": row[4],
+        "inputs": row[5],
+        "outputs": row[6],
+        "reasons": row[7],
+        "metrics": row[8],
+        "created_at": _isoformat(row[9])
+    }
+
+
+def _stream_rows(key, query, row_to_dict):
+    """
+    Stream {key: [row_to_dict(row), ...]} as the query's rows are fetched.
+    
+    Rows come from the cursor in _STREAM_BATCH_ROWS batches and each batch is
+    encoded and sent before the next is read, so the full list of dicts and
+    the full JSON body are never held at once.
+    """
+    statement = query.statement.execution_options(yield_per=_STREAM_BATCH_ROWS)
+    dumps = current_app.json.dumps
+    
+    def generate():
+        yield '{"%s":[' % key
+        separator = ''
+        for rows in db.session.execute(statement).partitions():
+            yield separator + ','.join(dumps(row_to_dict(row)) for row in rows)
+            separator = ','
+        yield ']}\n'
+    
+    return current_app.response_class(stream_with_context(generate()), mimetype='application/json')
+
 
 @query_bp.route('/api/pipelines', methods=['GET'])
 def list_pipelines():
     """List all pipelines"""
-    pipelines = Pipeline.query.order_by(Pipeline.created_at.desc()).all()
+    rows = db.session.query(*_PIPELINE_COLUMNS).order_by(Pipeline.created_at.desc()).all()
     return jsonify({
-        "pipelines": [p.to_dict() for p in pipelines]
+        "pipelines": [_pipeline_row(row) for row in rows]
     })
 
 
@@ -27,33 +111,28 @@ def list_runs():
     - pipeline: Filter by pipeline name
     - status: Filter by status
     - limit: Max results (default 50)
+    - include: "analysis" to return each run's analysis_result too
     """
-    query = Run.query
+    columns = _RUN_COLUMNS if request.args.get('include') == 'analysis' else _RUN_COLUMNS[:-1]
+    # One query: the pipeline name comes from the join instead of a lazy load per run
+    query = db.session.query(*columns).outerjoin(Pipeline, Run.pipeline_id == Pipeline.id)
     
     pipeline_name = request.args.get('pipeline')
     if pipeline_name:
-        pipeline = Pipeline.query.filter_by(name=pipeline_name).first()
-        if pipeline:
-            query = query.filter_by(pipeline_id=pipeline.id)
-        else:
-            return jsonify({"runs": []})
+        query = query.filter(Pipeline.name == pipeline_name)
     
     status = request.args.get('status')
     if status:
-        query = query.filter_by(status=status)
+        query = query.filter(Run.status == status)
     
     limit = request.args.get('limit', 50, type=int)
-    runs = query.order_by(Run.created_at.desc()).limit(limit).all()
-    
-    return jsonify({
-        "runs": [r.to_dict() for r in runs]
-    })
+    return _stream_rows("runs", query.order_by(Run.created_at.desc()).limit(limit), _run_row)
 
 
 @query_bp.route('/api/runs/<run_id>', methods=['GET'])
 def get_run(run_id):
     """Get a single run with all its steps"""
-    run = Run.query.get(run_id)
+    run = db.session.get(Run, run_id, options=[selectinload(Run.steps)]) if is_valid_id(run_id) else None
     if not run:
         return jsonify({"error": "Run not found"}), 404
     
@@ -63,28 +142,32 @@ def get_run(run_id):
 @query_bp.route('/api/runs/<run_id>/analysis', methods=['GET'])
 def get_analysis(run_id):
     """Get just the analysis result for a run"""
-    run = Run.query.get(run_id)
-    if not run:
+    # Only the three columns returned: no Run instance, joined pipeline or run_metadata
+    row = None
+    if is_valid_id(run_id):
+        row = db.session.query(Run.id, Run.status, Run.analysis_result).filter(Run.id == run_id).first()
+    if not row:
         return jsonify({"error": "Run not found"}), 404
     
     return jsonify({
-        "run_id": run.id,
-        "status": run.status,
-        "analysis": run.analysis_result
+        "run_id": row.id,
+        "status": row.status,
+        "analysis": row.analysis_result
     })
 
 
 @query_bp.route('/api/analyze/<run_id>', methods=['POST'])
 def trigger_analysis(run_id):
     """Trigger (re-)analysis for a run"""
-    run = Run.query.get(run_id)
+    run = db.session.get(Run, run_id) if is_valid_id(run_id) else None
     if not run:
         return jsonify({"error": "Run not found"}), 404
     
     try:
-        analyzer = XRayAnalyzer()
-        run_dict = run.to_dict(include_steps=True)
-        analysis_result = analyzer.analyze_run(run_dict)
+        analyzer = get_analyzer()
+        run_dict = run.to_dict_fast(db.session)
+        # A re-analysis must reach the LLM rather than replay cached verdicts
+        analysis_result = analyzer.analyze_run(run_dict, use_cache=False)
         
         run.analysis_result = analysis_result
         run.status = 'analyzed'
@@ -108,7 +191,7 @@ def search_steps():
     - step_name: Filter by step name
     - pipeline: Filter by pipeline name
     """
-    query = Step.query
+    query = db.session.query(*_STEP_COLUMNS)
     
     step_name = request.args.get('step_name')
     if step_name:
@@ -116,14 +199,10 @@ def search_steps():
     
     pipeline_name = request.args.get('pipeline')
     if pipeline_name:
-        pipeline = Pipeline.query.filter_by(name=pipeline_name).first()
-        if pipeline:
-            run_ids = [r.id for r in Run.query.filter_by(pipeline_id=pipeline.id).all()]
-            query = query.filter(Step.run_id.in_(run_ids))
+        pipeline_id = db.session.query(Pipeline.id).filter_by(name=pipeline_name).scalar()
+        if pipeline_id:
+            # Join rather than fetch the pipeline's run ids into an IN (...) list
+            query = query.join(Run, Step.run_id == Run.id).filter(Run.pipeline_id == pipeline_id)
     
     limit = request.args.get('limit', 50, type=int)
-    steps = query.order_by(Step.created_at.desc()).limit(limit).all()
-    
-    return jsonify({
-        "steps": [s.to_dict() for s in steps]
-    })
+    return _stream_rows("steps", query.order_by(Step.created_at.desc()).limit(limit), _step_row)
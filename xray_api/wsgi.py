@@ -1,7 +1,14 @@
 """
 WSGI entry point for production servers (e.g., gunicorn).
+
+    gunicorn --worker-class gthread --threads 8 --timeout 300 xray_api.wsgi:application
+
+Analysis holds a request open while LLM calls are in flight, so threaded
+workers keep other endpoints responsive; the worker count comes from
+WEB_CONCURRENCY.
 """
 
 from .app import create_app
 
 app = create_app()
+application = app
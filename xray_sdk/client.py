@@ -3,11 +3,13 @@ XRayClient - Sends run data to the X-Ray API for analysis
 """
 
 import os
-import json
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
-from typing import Dict, Any, Optional
-from .run import XRayRun
+from typing import Dict, Any, Iterator, List, Optional, Tuple
+from .run import XRayRun, _json_bytes, _json_loads
 
 
 class XRayClient:
@@ -18,9 +20,13 @@ class XRayClient:
     - Sends run data to API for AI-powered analysis
     - Spools to local file if API is unavailable
     - Supports API key authentication
+    - Reuses keep-alive connections across calls (use as a context manager or call close())
+    - Batches many runs into few requests over a shared connection
     """
     
     DEFAULT_SPOOL_DIR = ".xray_spool"
+    DEFAULT_BATCH_SIZE = 50
+    DEFAULT_MAX_CONCURRENT = 10
     
     def __init__(self, api_url: str, api_key: Optional[str] = None, timeout: int = 180):
         """
@@ -34,6 +40,24 @@ class XRayClient:
         self.api_url = api_url.rstrip("/")
         self.api_key = api_key
         self.timeout = timeout
+        self.session = requests.Session()
+        self.session.headers.update(self._headers())
+        # Retries connection failures (never re-sends a POST the server may have received)
+        # and gateway errors on the idempotent query calls
+        retry = Retry(total=3, backoff_factor=0.2, status_forcelist=[502, 503, 504])
+        adapter = HTTPAdapter(pool_connections=10, pool_maxsize=20, max_retries=retry)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+    
+    def close(self) -> None:
+        """Close the pooled connections."""
+        self.session.close()
+    
+    def __enter__(self) -> "XRayClient":
+        return self
+    
+    def __exit__(self, *exc_info) -> None:
+        self.close()
     
     def _headers(self) -> Dict[str, str]:
         """Build headers for API requests."""
@@ -42,16 +66,20 @@ class XRayClient:
             headers["X-API-Key"] = self.api_key
         return headers
     
-    def send(self, run: XRayRun, analyze: bool = True) -> Dict[str, Any]:
+    def send(self, run: XRayRun, analyze: bool = True, wait: bool = True) -> Dict[str, Any]:
         """
         Send a run to the X-Ray API for storage and optional analysis.
         
         Args:
             run: The XRayRun to send
             analyze: Whether to trigger AI analysis (default: True)
+            wait: Wait for the analysis result (default: True). With False the
+                API returns at once with status "queued"; poll get_analysis().
             
         Returns:
-            API response with run_id and analysis result (if requested)
+            API response with run_id and analysis result (if requested).
+            Runs are spooled locally when the API is unreachable, but not
+            after a read timeout, since the server already received them.
             
         Raises:
             requests.exceptions.RequestException: If API call fails
@@ -60,14 +88,17 @@ class XRayClient:
         payload["analyze"] = analyze
         
         try:
-            response = requests.post(
+            response = self.session.post(
                 f"{self.api_url}/api/ingest",
-                json=payload,
-                headers=self._headers(),
+                params=None if wait else {"async": "true"},
+                data=_json_bytes(payload),
                 timeout=self.timeout
             )
             response.raise_for_status()
             return response.json()
+        except requests.exceptions.ReadTimeout as e:
+            # The server received the run and may have stored it; spooling would store it twice
+            return {"error": str(e), "spooled": False}
         except requests.exceptions.RequestException as e:
             # Spool locally if API unavailable
             spool_path = self.spool(run)
@@ -97,14 +128,13 @@ class XRayClient:
         filename = f"{run.pipeline_name}_{timestamp}.json"
         filepath = spool_dir / filename
         
-        with open(filepath, "w") as f:
-            json.dump(run.to_dict(), f, indent=2, default=str)
+        filepath.write_bytes(_json_bytes(run.to_dict()))
         
         return filepath
 
     def list_pipelines(self) -> Dict[str, Any]:
         """List all pipelines."""
-        response = requests.get(f"{self.api_url}/api/pipelines", headers=self._headers(), timeout=self.timeout)
+        response = self.session.get(f"{self.api_url}/api/pipelines", timeout=self.timeout)
         response.raise_for_status()
         return response.json()
 
@@ -113,26 +143,29 @@ class XRayClient:
         pipeline: Optional[str] = None,
         status: Optional[str] = None,
         limit: int = 50,
+        include_analysis: bool = False,
     ) -> Dict[str, Any]:
-        """List runs with optional filters."""
+        """List runs with optional filters (analysis_result only with include_analysis)."""
         params = {"limit": limit}
         if pipeline:
             params["pipeline"] = pipeline
         if status:
             params["status"] = status
-        response = requests.get(f"{self.api_url}/api/runs", params=params, headers=self._headers(), timeout=self.timeout)
+        if include_analysis:
+            params["include"] = "analysis"
+        response = self.session.get(f"{self.api_url}/api/runs", params=params, timeout=self.timeout)
         response.raise_for_status()
         return response.json()
 
     def get_run(self, run_id: str) -> Dict[str, Any]:
         """Get a single run with all its steps."""
-        response = requests.get(f"{self.api_url}/api/runs/{run_id}", headers=self._headers(), timeout=self.timeout)
+        response = self.session.get(f"{self.api_url}/api/runs/{run_id}", timeout=self.timeout)
         response.raise_for_status()
         return response.json()
 
     def get_analysis(self, run_id: str) -> Dict[str, Any]:
         """Get analysis result for a run."""
-        response = requests.get(f"{self.api_url}/api/runs/{run_id}/analysis", headers=self._headers(), timeout=self.timeout)
+        response = self.session.get(f"{self.api_url}/api/runs/{run_id}/analysis", timeout=self.timeout)
         response.raise_for_status()
         return response.json()
 
@@ -148,51 +181,183 @@ class XRayClient:
             params["step_name"] = step_name
         if pipeline:
             params["pipeline"] = pipeline
-        response = requests.get(f"{self.api_url}/api/search/steps", params=params, headers=self._headers(), timeout=self.timeout)
+        response = self.session.get(f"{self.api_url}/api/search/steps", params=params, timeout=self.timeout)
         response.raise_for_status()
         return response.json()
     
-    def flush_spool(self, spool_dir: Optional[str] = None) -> Dict[str, Any]:
+    def send_many(
+        self,
+        runs: List[XRayRun],
+        analyze: bool = True,
+        max_batch_size: int = DEFAULT_BATCH_SIZE,
+        max_concurrent: int = DEFAULT_MAX_CONCURRENT,
+        wait: bool = False,
+    ) -> Dict[str, Any]:
         """
-        Send the newest spooled run to the API and delete all spooled files.
+        Send several runs to the X-Ray API using batched requests.
+        
+        Runs are grouped into batches of up to max_batch_size and posted to
+        /api/ingest/batch, with up to max_concurrent batches in flight over
+        one keep-alive session.
+        
+        Args:
+            runs: The XRayRuns to send
+            analyze: Whether to trigger AI analysis (default: True)
+            max_batch_size: Max runs per request (default: 50)
+            max_concurrent: Max batches sent in parallel (default: 10)
+            wait: Wait for the analysis results (default: False). Analyzed
+                runs come back with status "queued"; poll get_analysis().
+            
+        Returns:
+            Summary with per-run results in input order. Runs whose batch
+            failed are spooled locally and reported with "spooled": True,
+            except after a read timeout, when the server already has them.
+        """
+        max_batch_size = max(1, max_batch_size)
+        payloads = []
+        for run in runs:
+            payload = run.to_dict()
+            payload["analyze"] = analyze
+            payloads.append(payload)
+
+        results: List[Dict[str, Any]] = []
+        summary = {"sent": 0, "failed": 0, "results": results}
+        batches = sorted(self._send_batches(payloads, max_batch_size, max_concurrent, wait), key=lambda batch: batch[0])
+        for start, response in batches:
+            batch_runs = runs[start:start + max_batch_size]
+            if isinstance(response, requests.exceptions.ReadTimeout):
+                # Sent and possibly stored: spooling would store these runs twice
+                summary["failed"] += len(batch_runs)
+                results.extend({"error": str(response), "spooled": False} for _ in batch_runs)
+            elif isinstance(response, Exception):
+                summary["failed"] += len(batch_runs)
+                for run in batch_runs:
+                    spool_path = self.spool(run)
+                    results.append({
+                        "error": str(response),
+                        "spooled": True,
+                        "spool_path": str(spool_path)
+                    })
+            else:
+                summary["sent"] += len(batch_runs)
+                results.extend(response.get("results", []))
+        return summary
+
+    def _send_batches(
+        self,
+        payloads: List[Dict[str, Any]],
+        max_batch_size: int,
+        max_concurrent: int,
+        wait: bool = False,
+    ) -> Iterator[Tuple[int, Any]]:
+        """
+        POST payloads to /api/ingest/batch in chunks of max_batch_size.
+        
+        With wait the server analyzes before responding; otherwise analysis
+        is queued server-side (?async=true).
+        
+        Yields:
+            (start_index, response_json or exception) per batch, as each completes
+        """
+        starts = list(range(0, len(payloads), max_batch_size))
+        if not starts:
+            return
+
+        def post_batch(start: int):
+            try:
+                response = self.session.post(
+                    f"{self.api_url}/api/ingest/batch",
+                    params=None if wait else {"async": "true"},
+                    data=_json_bytes({"runs": payloads[start:start + max_batch_size]}),
+                    timeout=self.timeout
+                )
+                response.raise_for_status()
+                return start, response.json()
+            except requests.exceptions.RequestException as e:
+                return start, e
+
+        workers = max(1, min(max_concurrent, len(starts)))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(post_batch, start) for start in starts]
+            for future in as_completed(futures):
+                yield future.result()
+    
+    @staticmethod
+    def _read_spool_files(files: List[Path]) -> List[Tuple[Path, Any]]:
+        """
+        Read and decode spool files with overlapped I/O on a thread pool.
+        
+        Returns:
+            (path, decoded run or exception) per file, in input order
+        """
+        def read(filepath: Path):
+            try:
+                return filepath, _json_loads(filepath.read_bytes())
+            except Exception as e:
+                return filepath, e
+
+        if len(files) <= 1:
+            return [read(filepath) for filepath in files]
+        workers = min(32, (os.cpu_count() or 1) + 4, len(files))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            return list(executor.map(read, files))
+    
+    def flush_spool(
+        self,
+        spool_dir: Optional[str] = None,
+        max_batch_size: int = DEFAULT_BATCH_SIZE,
+        max_concurrent: int = DEFAULT_MAX_CONCURRENT,
+    ) -> Dict[str, Any]:
+        """
+        Send all spooled runs to the API in batches and delete the sent files.
+        
+        Analysis of the flushed runs is queued server-side rather than awaited.
         
         Args:
             spool_dir: Directory containing spooled files
+            max_batch_size: Max runs per request (default: 50)
+            max_concurrent: Max batches sent in parallel (default: 10)
             
         Returns:
             Summary of flush results
         """
+        max_batch_size = max(1, max_batch_size)
         spool_dir = Path(spool_dir or self.DEFAULT_SPOOL_DIR)
         if not spool_dir.exists():
             return {"flushed": 0, "failed": 0}
 
-        files = list(spool_dir.glob("*.json"))
+        files = sorted(spool_dir.glob("*.json"), key=lambda p: p.stat().st_mtime)
         if not files:
             return {"flushed": 0, "failed": 0}
 
-        newest = max(files, key=lambda p: p.stat().st_mtime)
-        results = {"flushed": 0, "failed": 0, "errors": [], "sent_file": str(newest)}
+        results = {"flushed": 0, "failed": 0, "errors": [], "responses": []}
 
-        try:
-            with open(newest) as f:
-                data = json.load(f)
+        loaded_files = []
+        payloads = []
+        for filepath, data in self._read_spool_files(files):
+            if isinstance(data, Exception):
+                results["failed"] += 1
+                results["errors"].append({"file": str(filepath), "error": str(data)})
+                continue
+            payloads.append(data)
+            loaded_files.append(filepath)
 
-            response = requests.post(
-                f"{self.api_url}/api/ingest",
-                json=data,
-                headers=self._headers(),
-                timeout=self.timeout
-            )
-            response.raise_for_status()
-            response_json = response.json()
-            results["flushed"] = 1
-            results["response"] = response_json
+        accepted = {}
+        for start, response in self._send_batches(payloads, max_batch_size, max_concurrent):
+            batch_files = loaded_files[start:start + max_batch_size]
+            if isinstance(response, Exception):
+                results["failed"] += len(batch_files)
+                for filepath in batch_files:
+                    results["errors"].append({"file": str(filepath), "error": str(response)})
+                continue
 
-            # Delete all spooled files after successful send of newest.
-            for filepath in files:
+            results["flushed"] += len(batch_files)
+            accepted[start] = response.get("results", [])
+            # Delete a batch's files as soon as it is accepted, so an interrupted
+            # flush does not re-send runs the server already stored.
+            for filepath in batch_files:
                 filepath.unlink()
-        except Exception as e:
-            results["failed"] = 1
-            results["errors"].append({"file": str(newest), "error": str(e)})
 
+        for start in sorted(accepted):
+            results["responses"].extend(accepted[start])
         return results
@@ -3,9 +3,44 @@ XRayRun - Represents a complete pipeline execution with multiple steps
 """
 
 import json
-from typing import List, Dict, Any, Optional
+import re
+from collections import deque
+from collections.abc import Iterator
+from itertools import islice
+from typing import Iterable, List, Dict, Any, Optional, Tuple
+try:
+    import orjson
+except ImportError:  # optional speedup (pip install xray-sdk[fast]); stdlib json is used without it
+    orjson = None
 from .step import XRayStep
 
+_ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS if orjson is not None else 0
+_json_loads = orjson.loads if orjson is not None else json.loads
+# Characters JSON strings escape: the short forms take 2 bytes, the rest \u00XX takes 6
+_ESCAPED_CHARS = re.compile(r'[\x00-\x1f"\\]')
+_SHORT_ESCAPES = frozenset('"\\\n\r\t\b\f')
+
+
+def _json_bytes(data: Any) -> bytes:
+    """Compact JSON via orjson, falling back to stdlib json for values it rejects (e.g. >64-bit ints)."""
+    if orjson is not None:
+        try:
+            return orjson.dumps(data, default=str, option=_ORJSON_OPTIONS)
+        except TypeError:
+            pass
+    return json.dumps(data, separators=(",", ":"), default=str, ensure_ascii=False).encode()
+
+
+def _json_str_size(text: str) -> int:
+    """Encoded length of a JSON string: UTF-8 bytes, quotes and escapes."""
+    if text.isascii():
+        size = len(text) + 2
+    else:
+        size = len(text.encode("utf-8", "surrogatepass")) + 2
+    for match in _ESCAPED_CHARS.finditer(text):
+        size += 1 if match.group() in _SHORT_ESCAPES else 5
+    return size
+
 
 class XRayRun:
     """
@@ -18,6 +53,7 @@ class XRayRun:
     SAMPLE_SIZE = 100         # initial sample size per large list
     MIN_SAMPLE_SIZE = 10      # floor for aggressive trimming when still oversized
     STRING_TRUNCATE = 2000    # truncate very long strings to this many chars
+    FAST_ACCEPT_RATIO = 0.8   # payloads estimated under this share of the budget skip the exact encode
     
     def __init__(
         self,
@@ -48,20 +84,68 @@ class XRayRun:
         """
         Add a step to this run. Auto-summarizes large outputs.
         
+        Iterator values (e.g. from XRayStep.add_output_stream) are consumed
+        here, keeping only a head/tail sample once they outgrow the budget.
+        
         Args:
             step: The XRayStep to add
         """
-        step.inputs = self._ensure_within_budget(step.inputs)
-        step.outputs = self._ensure_within_budget(step.outputs)
+        step.inputs = self._ensure_within_budget(self._collect_streams(step.inputs))
+        step.outputs = self._ensure_within_budget(self._collect_streams(step.outputs))
         
         self.steps.append(step)
 
+    def _collect_streams(self, data: Any) -> Any:
+        """Materialize top-level iterator values of a dict into (sampled) lists."""
+        if not isinstance(data, dict) or not any(isinstance(v, Iterator) for v in data.values()):
+            return data
+        collected = {}
+        for key, value in data.items():
+            if isinstance(value, Iterator):
+                items, total_count = self._collect_stream(value)
+                collected[key] = items
+                if total_count is not None:
+                    collected[f"{key}_total_count"] = total_count
+            else:
+                collected[key] = value
+        return collected
+
+    def _collect_stream(self, iterable: Iterable[Any]) -> Tuple[List[Any], Optional[int]]:
+        """
+        Consume an iterable without holding more than the budget in memory.
+        
+        Items are kept while their running serialized size fits under
+        MAX_PAYLOAD_SIZE. Past that, only the first half of sample_size and
+        a rolling tail of the rest are retained, as in _summarize_list.
+        """
+        head_count = self.sample_size // 2
+        items: List[Any] = []
+        tail = None
+        size = 2  # "[]"
+        total_count = 0
+        for item in iterable:
+            total_count += 1
+            if tail is not None:
+                tail.append(item)
+                continue
+            items.append(item)
+            size += len(_json_bytes(item)) + 1  # "," separator
+            if size > self.MAX_PAYLOAD_SIZE:
+                tail = deque(items[head_count:], maxlen=self.sample_size - head_count)
+                del items[head_count:]
+        if tail is None:
+            return items, None
+        items.extend(tail)
+        return items, total_count
+
     def _ensure_within_budget(self, data: Any) -> Any:
         """Summarize data if it exceeds MAX_PAYLOAD_SIZE."""
         if data is None:
             return {}
+        if self._approx_size(data, self.MAX_PAYLOAD_SIZE) <= self.MAX_PAYLOAD_SIZE * self.FAST_ACCEPT_RATIO:
+            return data
         try:
-            size = len(json.dumps(data, default=str))
+            size = len(_json_bytes(data))
         except Exception:
             size = self.MAX_PAYLOAD_SIZE + 1  # force summarization if not serializable
         if size <= self.MAX_PAYLOAD_SIZE:
@@ -69,54 +153,113 @@ class XRayRun:
         # Log summarization
         print(f"   [SDK] Summarizing large payload: {size} chars -> MAX {self.MAX_PAYLOAD_SIZE} chars")
         summarized = self._summarize_with_budget(data)
-        new_size = len(json.dumps(summarized, default=str))
+        new_size = len(_json_bytes(summarized))
         print(f"   [SDK] Summarization complete: {size} -> {new_size} chars")
         return summarized
 
+    @staticmethod
+    def _approx_size(data: Any, limit: int) -> int:
+        """
+        Estimate the compact JSON length of data without encoding it.
+        
+        Sums leaf lengths plus quotes and separators (one separator too many
+        per container), and stops as soon as the running total passes limit.
+        Strings are counted as encoded UTF-8 with their escapes; number and
+        fallback str() formatting can still differ slightly, hence the
+        FAST_ACCEPT_RATIO margin before trusting it.
+        """
+        size = 0
+        pending = [data]
+        while pending:
+            item = pending.pop()
+            if isinstance(item, dict):
+                size += 2 + len(item)  # braces and one ":" per key
+                for key, value in item.items():
+                    size += _json_str_size(str(key)) + 1  # "," separator
+                    pending.append(value)
+            elif isinstance(item, (list, tuple)):
+                size += 2 + len(item)  # brackets and "," separators
+                pending.extend(item)
+            elif isinstance(item, str):
+                size += _json_str_size(item)
+            elif item is None or isinstance(item, (int, float)):
+                size += len(str(item))  # None/True/False match the lengths of null/true/false
+            else:
+                size += _json_str_size(str(item))  # other objects are encoded via default=str
+            if size > limit:
+                break
+        return size
+
     def _summarize_with_budget(self, data: Any) -> Any:
         """Iteratively summarize until payload fits under MAX_PAYLOAD_SIZE."""
         sample_size = self.sample_size
         summarized = data
         while True:
-            summarized = self._summarize_once(summarized, sample_size)
-            size = len(json.dumps(summarized, default=str))
+            summarized, _ = self._summarize_once(summarized, sample_size)
+            size = len(_json_bytes(summarized))
             if size <= self.MAX_PAYLOAD_SIZE or sample_size <= self.MIN_SAMPLE_SIZE:
                 return summarized
             sample_size = max(self.MIN_SAMPLE_SIZE, sample_size // 2)
     
-    def _summarize_once(self, data: Any, sample_size: int) -> Any:
-        """One-pass summarization with recursion and string truncation."""
+    def _summarize_once(self, data: Any, sample_size: int) -> Tuple[Any, bool]:
+        """
+        One-pass summarization with recursion and string truncation; returns (result, modified).
+        
+        Copy-on-write: a dict or list is only rebuilt once one of its children
+        changes, so untouched subtrees are returned as the original objects.
+        """
         if isinstance(data, dict):
-            summarized = {}
-            for key, value in data.items():
+            summarized = None
+            for index, (key, value) in enumerate(data.items()):
+                total_count = None
                 if isinstance(value, list):
-                    summarized_list, total_count = self._summarize_list(value, sample_size)
-                    summarized[key] = summarized_list
+                    new_value, total_count = self._summarize_list(value, sample_size)
+                    modified = new_value is not value
+                else:
+                    new_value, modified = self._summarize_once(value, sample_size)
+                if modified and summarized is None:
+                    summarized = dict(islice(data.items(), index))
+                if summarized is not None:
+                    summarized[key] = new_value
                     if total_count is not None:
                         summarized[f"{key}_total_count"] = total_count
-                else:
-                    summarized[key] = self._summarize_once(value, sample_size)
-            return summarized
+            if summarized is None:
+                return data, False
+            return summarized, True
         if isinstance(data, list):
             summarized_list, _ = self._summarize_list(data, sample_size)
-            return summarized_list
+            return summarized_list, summarized_list is not data
         if isinstance(data, str) and len(data) > self.STRING_TRUNCATE:
             overflow = len(data) - self.STRING_TRUNCATE
-            return f"{data[:self.STRING_TRUNCATE]}...[truncated {overflow} chars]"
-        return data
+            return f"{data[:self.STRING_TRUNCATE]}...[truncated {overflow} chars]", True
+        return data, False
     
-    def _summarize_list(self, items: List[Any], sample_size: int):
-        """Summarize a list: sample if large, recurse into elements."""
+    def _summarize_list(self, items: List[Any], sample_size: int) -> Tuple[List[Any], Optional[int]]:
+        """Summarize a list: sample if large, recurse into elements. Returns items itself if unchanged."""
         total_count = None
         if len(items) > sample_size:
             total_count = len(items)
             head_count = sample_size // 2
             tail_count = sample_size - head_count
             items = items[:head_count] + items[-tail_count:]
-        return [self._summarize_once(item, sample_size) for item in items], total_count
+        summarized = None
+        for index, item in enumerate(items):
+            if not isinstance(item, (dict, list)) and (not isinstance(item, str) or len(item) <= self.STRING_TRUNCATE):
+                # Leaf that needs no summarizing (the common case for rows/metrics); skip the call
+                if summarized is not None:
+                    summarized.append(item)
+                continue
+            new_item, modified = self._summarize_once(item, sample_size)
+            if modified and summarized is None:
+                summarized = items[:index]
+            if summarized is not None:
+                summarized.append(new_item)
+        if summarized is None:
+            return items, total_count
+        return summarized, total_count
     
     def to_dict(self) -> Dict[str, Any]:
-        """Convert run to dictionary for JSON serialization"""
+        """Convert run to dictionary for JSON serialization (step payloads are referenced, not copied)"""
         return {
             "pipeline_name": self.pipeline_name,
             "pipeline_description": self.description,
@@ -2,8 +2,8 @@
 XRayStep - Represents a single step in a pipeline execution
 """
 
-from dataclasses import dataclass, field, asdict
-from typing import Dict, Any
+from dataclasses import dataclass, field
+from typing import Dict, Any, Iterable
 
 
 @dataclass
@@ -28,9 +28,27 @@ class XRayStep:
     reasons: Dict[str, Any] = field(default_factory=dict)
     metrics: Dict[str, Any] = field(default_factory=dict)
     
+    def add_output_stream(self, key: str, items: Iterable[Any]) -> "XRayStep":
+        """
+        Attach a lazily-produced list output (e.g. a generator expression).
+        
+        The iterable is consumed when the step is added to an XRayRun, which
+        samples it on the fly so the full list never has to exist in memory.
+        """
+        self.outputs[key] = iter(items)
+        return self
+    
     def to_dict(self) -> Dict[str, Any]:
-        """Convert step to dictionary for JSON serialization"""
-        return asdict(self)
+        """Convert step to dictionary for JSON serialization (values are not deep-copied)"""
+        return {
+            "name": self.name,
+            "order": self.order,
+            "inputs": self.inputs,
+            "outputs": self.outputs,
+            "description": self.description,
+            "reasons": self.reasons,
+            "metrics": self.metrics,
+        }
     
     def __repr__(self) -> str:
         return f"XRayStep(name='{self.name}', order={self.order})"